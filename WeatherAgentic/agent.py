@@ -1,6 +1,6 @@
 
 from agents import Agent, function_tool, Runner, ModelSettings
-from tools import get_weather, recommend_clothing
+from tools import get_forecast, get_weather, get_weather_many, recommend_clothing
 
 
 # ============================
@@ -14,18 +14,24 @@ weather_agent = Agent(
         "\n"
         "Capabilities:\n"
         "- Use get_weather to fetch REAL current weather data for a city.\n"
+        "- Use get_weather_many to fetch several cities in one call (comparisons, trips, lists of places).\n"
+        "- Use get_forecast for later today, tonight, tomorrow or the day after (day 0-2, optional hour 0-23).\n"
         "- Use recommend_clothing to give clothing / jacket / umbrella advice based on temperature and conditions.\n"
         "\n"
         "Behavior:\n"
         "- If the user asks about weather (temperature, conditions, humidity, etc.), "
         "call get_weather and summarize the result in friendly language.\n"
+        "- If the question involves more than one city, make a single get_weather_many call "
+        "with all of them instead of calling get_weather for each.\n"
+        "- If the user asks about a later time (\"will it rain tonight?\", \"tomorrow\"), call get_forecast "
+        "with the day and, for a specific time of day, the hour (morning 9, afternoon 15, evening 18, tonight 21).\n"
         "- If the user asks what to wear, whether they need a jacket, coat, or umbrella, "
         "FIRST call get_weather, THEN call recommend_clothing using the temperature in Celsius and condition.\n"
         "- Combine the tool outputs into a single helpful answer.\n"
         "- If the weather tool returns an error, apologize, explain that the data could not be fetched, "
         "and avoid making up specific temperatures.\n"
     ),
-    tools=[get_weather, recommend_clothing],
+    tools=[get_weather, get_weather_many, get_forecast, recommend_clothing],
     model_settings=ModelSettings(
         temperature=0.2,
     ),
@@ -0,0 +1,146 @@
+# backend/admission.py
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised by AdmissionController.admit(); the API turns it into a 429.
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Decides whether a new task may be queued.
+
+    A task is rejected when the queue already holds `max_depth` tasks of its
+    priority class (`max_batch_depth` for batch submissions), or when its
+    client already has `max_per_client` unfinished tasks. The
+    suggested Retry-After is how long the workers need to drain the current
+    queue at the service rate observed over the last `rate_window`
+    completions.
+    """
+
+    def __init__(
+        self,
+        max_depth: int,
+        max_per_client: int,
+        max_batch_depth: int = 0,
+        rate_window: int = 100,
+        default_retry_after: int = 5,
+        max_retry_after: int = 120,
+    ):
+        self.max_depth = max_depth
+        self.max_per_client = max_per_client
+        self.max_batch_depth = max_batch_depth
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+
+        self._completions: Deque[float] = deque(maxlen=rate_window)
+        self._task_client: Dict[str, str] = {}
+        self._client_inflight: Dict[str, int] = {}
+        # Batch tasks are counted apart, so a client's batch does not use up
+        # its per-client slots for interactive tasks.
+        self._batch_task_client: Dict[str, str] = {}
+        self._batch_inflight: Dict[str, int] = {}
+
+        self.admitted = 0
+        self.rejected_depth = 0
+        self.rejected_client = 0
+
+    def service_rate(self) -> float:
+        """
+        Completed tasks per second over the recent window (0 if unknown).
+        """
+        if len(self._completions) < 2:
+            return 0.0
+        span = self._completions[-1] - self._completions[0]
+        return (len(self._completions) - 1) / span if span > 0 else 0.0
+
+    def retry_after(self, depth: int) -> int:
+        rate = self.service_rate()
+        if rate <= 0:
+            return self.default_retry_after
+        return max(1, min(self.max_retry_after, math.ceil(depth / rate)))
+
+    def admit(self, task_id: str, client_id: str, depth: int):
+        """
+        Admit a task or raise AdmissionRejected. `depth` is the number of
+        tasks of the same priority class currently waiting in the queue.
+        """
+        if self.max_depth > 0 and depth >= self.max_depth:
+            self.rejected_depth += 1
+            raise AdmissionRejected("Task queue is full", self.retry_after(depth))
+
+        inflight = self._client_inflight.get(client_id, 0)
+        if self.max_per_client > 0 and inflight >= self.max_per_client:
+            self.rejected_client += 1
+            # One of this client's own tasks has to finish first.
+            raise AdmissionRejected(
+                f"Too many unfinished tasks for client (limit {self.max_per_client})",
+                self.retry_after(max(1, min(depth, inflight))),
+            )
+
+        self._task_client[task_id] = client_id
+        self._client_inflight[client_id] = inflight + 1
+        self.admitted += 1
+
+    def admit_batch(self, task_ids: List[str], client_id: str, depth: int):
+        """
+        Admit a whole batch or none of it. Only the queue-depth limit
+        applies: batches are expected to exceed the per-client cap, and the
+        scheduler already keeps one client's backlog from starving others.
+        """
+        n = len(task_ids)
+        if self.max_batch_depth > 0 and depth + n > self.max_batch_depth:
+            self.rejected_depth += n
+            raise AdmissionRejected(
+                f"Batch of {n} does not fit in the task queue "
+                f"({depth} of {self.max_batch_depth} slots used)",
+                self.retry_after(depth + n - self.max_batch_depth),
+            )
+        for task_id in task_ids:
+            self._batch_task_client[task_id] = client_id
+        self._batch_inflight[client_id] = self._batch_inflight.get(client_id, 0) + n
+        self.admitted += n
+
+    def release(self, task_id: str, completed: bool):
+        """
+        Called when a task finishes: frees its client's slot and, if it
+        completed successfully, feeds the service-rate estimate (cancelled
+        and failed tasks say nothing about how fast the queue drains).
+        """
+        if completed:
+            self._completions.append(time.monotonic())
+        inflight = self._client_inflight
+        client_id = self._task_client.pop(task_id, None)
+        if client_id is None:
+            inflight = self._batch_inflight
+            client_id = self._batch_task_client.pop(task_id, None)
+            if client_id is None:
+                return
+        left = inflight[client_id] - 1
+        if left:
+            inflight[client_id] = left
+        else:
+            del inflight[client_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_depth": self.max_depth,
+            "max_per_client": self.max_per_client,
+            "max_batch_depth": self.max_batch_depth,
+            "admitted": self.admitted,
+            "rejected_depth": self.rejected_depth,
+            "rejected_client": self.rejected_client,
+            "clients_with_inflight": len(self._client_inflight),
+            "clients_with_batches": len(self._batch_inflight),
+            "service_rate_per_s": round(self.service_rate(), 3),
+        }
@@ -0,0 +1,55 @@
+# backend/answer_cache.py
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from weather_cache import TTLCache
+
+# (city key, weather cache version) pairs an answer was based on
+WeatherDeps = Tuple[Tuple[Hashable, Optional[int]], ...]
+
+
+class AnswerCache:
+    """
+    Cache of final agent answers keyed on the normalized user input.
+
+    Each answer remembers the weather snapshots (cache versions) its tool
+    calls returned. A cached answer is only served while every one of those
+    snapshots is still the current, fresh entry in the weather cache, so
+    answers never outlive the data they describe. Answers built on a failed
+    weather fetch are not cached.
+    """
+
+    def __init__(self, weather_cache: TTLCache, ttl: float, max_size: int):
+        self._weather = weather_cache
+        self._answers: TTLCache[Tuple[str, WeatherDeps]] = TTLCache(ttl=ttl, max_size=max_size)
+        self.stale = 0
+        self.uncacheable = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._answers.get(key)
+        if entry is None:
+            return None
+        answer, deps = entry
+        for city_key, version in deps:
+            if self._weather.version(city_key) != version:
+                # Weather was refreshed or evicted since this answer was made.
+                self._answers.invalidate(key)
+                self.stale += 1
+                return None
+        return answer
+
+    def put(self, key: str, answer: str, deps: List[Tuple[Hashable, Optional[int]]]):
+        if any(version is None for _, version in deps):
+            self.uncacheable += 1
+            return
+        self._answers.set(key, (answer, tuple(deps)))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._answers.stats()
+        # A "hit" from the underlying cache that turned out stale is a miss.
+        stats["hits"] -= self.stale
+        stats["misses"] += self.stale
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+        stats["stale"] = self.stale
+        stats["uncacheable"] = self.uncacheable
+        return stats
@@ -1,14 +1,42 @@
 # backend/api.py
 import asyncio
+import json
 import os
 import uuid
-from typing import List
+from typing import Any, Dict, List, Literal
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from .models import TaskRequest, TaskStatus, TaskEvent
-from .task_queue import task_queue, tasks, events
-from .worker import worker_loop
+from metrics import REGISTRY, CallbackMetric
+from weather_api import close_client, weather_cache
+
+from .admission import AdmissionRejected
+from .models import BatchSubmitted, TaskRequest, TaskStatus, TaskEvent, TaskTrace, WorkerPoolStats
+from .task_queue import (
+    BATCH_MAX_SIZE,
+    admission,
+    batches,
+    coalescer,
+    tasks,
+    event_log,
+    journal,
+    broker,
+    enqueue_task,
+    enqueue_batch,
+    cancel_task,
+    lookup_task,
+    task_queue,
+    recover_tasks,
+    broker_feed_loop,
+    sessions,
+    streams,
+    traces,
+)
+from .cache_warmer import cache_warmer
+from .fast_path import fast_path
+from .prefetch import prefetcher
+from .worker import WorkerPool, answer_cache
 
 if not os.getenv("OPENAI_API_KEY"):
     raise RuntimeError("OPENAI_API_KEY not set")
@@ -19,24 +47,245 @@ app = FastAPI(
 )
 
 
+worker_pool = WorkerPool()
+
+CallbackMetric(
+    "weatheragent_workers",
+    "In-process workers by state",
+    lambda: {
+        ("busy",): worker_pool.busy_count,
+        ("idle",): worker_pool.size - worker_pool.busy_count,
+    },
+    ["state"],
+)
+CallbackMetric(
+    "weatheragent_worker_busy_seconds_total",
+    "Seconds in-process workers spent running tasks (rate() / workers = utilization)",
+    lambda: worker_pool.busy_seconds_total,
+    kind="counter",
+)
+
+# Other long-lived background tasks (cancelled on shutdown)
+background_tasks: List[asyncio.Task] = []
+
+
 @app.on_event("startup")
 async def startup_event():
-    # Start background worker when app starts
-    asyncio.create_task(worker_loop())
+    # Re-enqueue anything left over from a previous run, then start the
+    # background worker pool
+    recovered = recover_tasks()
+    if recovered:
+        print(f"Backend startup: recovered {recovered} unfinished task(s)")
+    if broker is None:
+        await worker_pool.start()
+        # Weather lookups happen in the worker pool, so does the warming.
+        background_tasks.append(asyncio.create_task(cache_warmer.run()))
+    else:
+        # Agents run in separate `python -m backend.worker` processes.
+        background_tasks.append(asyncio.create_task(broker_feed_loop()))
+    background_tasks.append(asyncio.create_task(tasks.sweep_loop()))
+    if journal is not None:
+        background_tasks.append(asyncio.create_task(journal.flush_loop()))
+
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await worker_pool.stop()
+    for t in background_tasks:
+        t.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if journal is not None:
+        journal.close()
+    if broker is not None:
+        broker.close()
+    traces.close()
+    await close_client()
 
-@app.post("/tasks", response_model=TaskStatus)
-async def create_task(req: TaskRequest):
+
+def client_id_for(request: Request, x_client_id: str | None) -> str:
+    """
+    Clients identify themselves with X-Client-Id; otherwise the peer address
+    is used for per-client limits.
+    """
+    if x_client_id:
+        return x_client_id
+    return request.client.host if request.client else "anonymous"
+
+
+@app.post(
+    "/tasks",
+    response_model=TaskStatus,
+    responses={429: {"description": "Queue full or per-client limit reached; see Retry-After"}},
+)
+async def create_task(
+    req: TaskRequest,
+    request: Request,
+    x_client_id: str | None = Header(None),
+):
     """
     Frontend sends a user query here.
-    We enqueue the task and return a task_id immediately.
+    We enqueue the task and return a task_id immediately, or answer 429
+    with a Retry-After header when the backend is already saturated.
     """
     task_id = str(uuid.uuid4())
-    task_status = TaskStatus(task_id=task_id, status="queued")
-    tasks[task_id] = task_status
+    try:
+        return await enqueue_task(
+            task_id,
+            req.input,
+            client_id=client_id_for(request, x_client_id),
+            priority=req.priority,
+            session_id=req.session_id,
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def _batch_item_input(item: Any) -> str:
+    # Each item is either the input string or {"input": "..."}
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and isinstance(item.get("input"), str):
+        return item["input"]
+    raise HTTPException(status_code=422, detail=f"Invalid batch item: {item!r:.100}")
+
+
+def _ndjson_line_input(line: bytes, lineno: int) -> str:
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        # JSONDecodeError, or UnicodeDecodeError for bytes that are not UTF-8
+        raise HTTPException(status_code=422, detail=f"Invalid JSON on line {lineno}: {e}")
+    return _batch_item_input(item)
+
+
+async def _read_batch_inputs(request: Request) -> List[str]:
+    """
+    Parse a JSON array, or (Content-Type: application/x-ndjson) one JSON
+    value per line, read incrementally from the request stream.
+    """
+    inputs: List[str] = []
 
-    await task_queue.put((task_id, req.input))
-    return task_status
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+        lineno = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                lineno += 1
+                if line.strip():
+                    inputs.append(_ndjson_line_input(line, lineno))
+            if len(inputs) > BATCH_MAX_SIZE:
+                break
+        if buffer.strip():
+            inputs.append(_ndjson_line_input(buffer, lineno + 1))
+    else:
+        body = json.loads(await request.body())
+        if not isinstance(body, list):
+            raise HTTPException(status_code=422, detail="Expected a JSON array of inputs")
+        inputs = [_batch_item_input(item) for item in body]
+
+    return inputs
+
+
+@app.post(
+    "/tasks/batch",
+    response_model=BatchSubmitted,
+    responses={
+        413: {"description": "More than BATCH_MAX_SIZE inputs"},
+        429: {"description": "Batch does not fit in the queue; see Retry-After"},
+    },
+)
+async def create_batch(
+    request: Request,
+    priority: Literal["interactive", "batch"] = Query("batch"),
+    x_client_id: str | None = Header(None),
+):
+    """
+    Submit many inputs in one request: a JSON array, or NDJSON with
+    Content-Type: application/x-ndjson. Items are strings or {"input": ...}.
+    All tasks are enqueued at once and their ids returned in input order.
+    """
+    try:
+        inputs = await _read_batch_inputs(request)
+    except ValueError as e:
+        # JSONDecodeError, or UnicodeDecodeError for a body that is not UTF-8
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+    if not inputs:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(inputs) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {BATCH_MAX_SIZE} inputs")
+
+    try:
+        batch_id, task_ids = await enqueue_batch(
+            inputs,
+            client_id=client_id_for(request, x_client_id),
+            priority=priority,
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return BatchSubmitted(batch_id=batch_id, count=len(task_ids), task_ids=task_ids)
+
+
+@app.get("/tasks/batch/{batch_id}")
+async def stream_batch_results(batch_id: str, request: Request):
+    """
+    Stream a batch's results as NDJSON, one line per task as it finishes
+    (tasks already finished come first). The response ends once every task
+    in the batch has reported.
+    """
+    task_ids = batches.get(batch_id)
+    if task_ids is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    def line(index: int, task: TaskStatus | None) -> str:
+        return json.dumps({
+            "index": index,
+            "task_id": task_ids[index],
+            "status": task.status if task else "expired",
+            "result": task.result if task else None,
+            "error": task.error if task else None,
+        }) + "\n"
+
+    async def results():
+        pending: Dict[str, int] = {}
+        cursor = event_log.last_event_id
+        for index, task_id in enumerate(task_ids):
+            task = tasks.get(task_id)
+            if task is None or task.status in ("done", "error"):
+                yield line(index, task)
+            else:
+                pending[task_id] = index
+
+        while pending and not await request.is_disconnected():
+            if cursor < event_log.first_event_id - 1:
+                # Events past the cursor were evicted from the ring buffer
+                # before we read them: check the stragglers directly.
+                cursor = event_log.last_event_id
+                for task_id in [t for t in pending if t not in tasks or tasks[t].status in ("done", "error")]:
+                    yield line(pending.pop(task_id), tasks.get(task_id))
+                continue
+            evs = await event_log.wait(after=cursor, timeout=15.0)
+            if evs and evs[0].event_id > cursor + 1:
+                # Some were evicted while we waited; handled above.
+                continue
+            if evs:
+                cursor = evs[-1].event_id
+            for ev in evs:
+                index = pending.pop(ev.task_id, None)
+                if index is not None:
+                    yield line(index, tasks.get(ev.task_id))
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
 @app.get("/tasks/{task_id}", response_model=TaskStatus)
@@ -45,18 +294,237 @@ async def get_task_status(task_id: str):
     Optional: direct task status lookup.
     (Not strictly needed if you only use /events, but handy for debugging.)
     """
-    task = tasks.get(task_id)
+    task = await lookup_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
 
+@app.delete("/tasks/{task_id}", response_model=TaskStatus)
+async def delete_task(task_id: str):
+    """
+    Cancel a queued or running task. It finishes right away with status
+    "error" and error "Task cancelled", and its worker is freed (unless
+    identical tasks coalesced onto the same run still need the answer).
+    """
+    task = await lookup_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.status in ("done", "error"):
+        raise HTTPException(status_code=409, detail=f"Task already finished ({task.status})")
+    return await cancel_task(task_id)
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    """
+    Forget a conversation's history; its next task starts a fresh one.
+    """
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return Response(status_code=204)
+
+
 @app.get("/events", response_model=List[TaskEvent])
-async def get_events():
+async def get_events(
+    response: Response,
+    after: int = Query(0, ge=0, description="Return events with event_id > after"),
+    task_id: str | None = Query(None, description="Only events for this task"),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Frontend calls /events to receive completed task events.
+
+    Reads are non-destructive: each client keeps its own cursor and passes
+    the last event_id it has seen as `after`. X-Last-Event-Id carries the
+    newest id in the log (useful as the next cursor when filtering by
+    task_id); X-First-Event-Id the oldest one still retained, so a client
+    whose cursor is older knows it missed events.
+    """
+    response.headers["X-Last-Event-Id"] = str(event_log.last_event_id)
+    response.headers["X-First-Event-Id"] = str(event_log.first_event_id)
+    return event_log.read(after=after, task_id=task_id, limit=limit)
+
+
+@app.get("/tasks/{task_id}/wait", response_model=TaskStatus)
+async def wait_for_task(
+    task_id: str,
+    timeout: float = Query(30.0, gt=0, le=120, description="Max seconds to hold the request"),
+):
+    """
+    Long-poll: returns as soon as the task is done/error, or after
+    `timeout` seconds with its current status. Clients simply call
+    again while status is still "queued" or "running".
+    """
+    task = await lookup_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.status in ("done", "error"):
+        return task
+
+    await event_log.wait(after=event_log.last_event_id, task_id=task_id, timeout=timeout)
+    return await lookup_task(task_id) or task
+
+
+@app.get("/tasks/{task_id}/trace", response_model=TaskTrace)
+async def get_task_trace(
+    task_id: str,
+    format: Literal["json", "jsonl"] = Query("json", description="jsonl: one span per line"),
+):
+    """
+    Execution timeline of a task: enqueued, dequeued, each model call with
+    its token usage, each tool call, and the final event. Offsets are in
+    milliseconds since the task was enqueued.
+    """
+    trace = traces.get(task_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    if format == "jsonl":
+        return PlainTextResponse(trace.to_jsonl(), media_type="application/x-ndjson")
+    return trace.to_model()
+
+
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+@app.get("/events/stream")
+async def stream_events(
+    request: Request,
+    after: int | None = Query(None, ge=0, description="Start after this event_id (default: now)"),
+    task_id: str | None = Query(None, description="Only events for this task"),
+    last_event_id: str | None = Header(None),
+):
+    """
+    Server-Sent Events stream of task events, pushed the moment add_event
+    fires. Reconnecting clients resume from the Last-Event-ID header.
+    """
+    if last_event_id is not None and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    elif after is not None:
+        cursor = after
+    else:
+        cursor = event_log.last_event_id
+
+    async def event_source():
+        nonlocal cursor
+        while not await request.is_disconnected():
+            evs = await event_log.wait(
+                after=cursor,
+                task_id=task_id,
+                timeout=SSE_HEARTBEAT_SECONDS,
+            )
+            if not evs:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+                continue
+            for ev in evs:
+                yield f"id: {ev.event_id}\nevent: task\ndata: {ev.model_dump_json()}\n\n"
+            cursor = evs[-1].event_id
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/tasks/{task_id}/stream")
+async def stream_task_output(task_id: str, request: Request):
+    """
+    Server-Sent Events stream of one task's output while it runs: "delta"
+    events carry answer text as the model generates it, "tool_call" and
+    "tool_output" report tool progress, and a final "task" event carries
+    the TaskStatus (the same one GET /tasks/{task_id} returns).
+    """
+    task = await lookup_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_source():
+        if task.status not in ("done", "error"):
+            fresh = streams.get(task_id) is None
+            stream = streams.open(task_id)
+            # The task may have finished, and its stream been closed, since
+            # the lookup above: don't leave the stream just opened behind.
+            latest = tasks.get(task_id) or await lookup_task(task_id) or task
+            if fresh and latest.status in ("done", "error"):
+                streams.close(task_id)
+            cursor = 0
+            while not await request.is_disconnected():
+                chunks = await stream.wait(after=cursor, timeout=SSE_HEARTBEAT_SECONDS)
+                for kind, data in chunks:
+                    yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+                cursor += len(chunks)
+                if stream.closed and cursor == len(stream.chunks):
+                    break
+                own = tasks.get(task_id)
+                if own is not None and own.status in ("done", "error"):
+                    # e.g. cancelled while the shared run goes on for others
+                    break
+                if not chunks:
+                    yield ": keep-alive\n\n"
+            else:
+                return
+        final = await lookup_task(task_id) or task
+        yield f"event: task\ndata: {final.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/workers", response_model=WorkerPoolStats)
+async def get_workers():
+    """
+    Worker pool size, queue depth and per-worker counters.
+    In external mode these come from the worker processes via the broker.
+    """
+    if broker is None:
+        return worker_pool.stats()
+
+    workers = await asyncio.to_thread(broker.worker_stats)
+    return WorkerPoolStats(
+        size=len(workers),
+        min_workers=len(workers),
+        max_workers=len(workers),
+        busy=sum(1 for w in workers if w.busy),
+        queue_depth=await asyncio.to_thread(broker.queue_depth),
+        workers=workers,
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text-format metrics: queue depth and wait, task latency,
+    agent run and tool latency histograms, error counts, worker utilization.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def get_stats() -> Dict[str, Any]:
     """
-    Frontend calls /events to receive any completed task events.
-    For demo simplicity, we return all current events and then clear the list.
+    Cache and task-store counters (sizes, hits, evictions, ...) for
+    tuning TTLs and retention limits.
     """
-    current_events = list(events)
-    events.clear()
-    return current_events
+    return {
+        "admission": admission.stats(),
+        "scheduler": task_queue.stats(),
+        "coalescing": coalescer.stats(),
+        "sessions": sessions.stats(),
+        "tasks": {**tasks.stats(), "streaming": len(streams)},
+        "event_log": {
+            "size": len(event_log),
+            "capacity": event_log.capacity,
+            "last_event_id": event_log.last_event_id,
+        },
+        "journal": journal.stats() if journal is not None else None,
+        "weather_cache": weather_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "fast_path": fast_path.stats(),
+        "prefetch": prefetcher.stats(),
+        "cache_warmer": cache_warmer.stats(),
+    }
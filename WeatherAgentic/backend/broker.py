@@ -0,0 +1,431 @@
+# backend/broker.py
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .models import TaskEvent, TaskStatus, WorkerStats
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broker_tasks (
+    task_id       TEXT PRIMARY KEY,
+    input         TEXT NOT NULL,
+    priority      TEXT NOT NULL DEFAULT 'interactive',
+    client_id     TEXT NOT NULL DEFAULT 'anonymous',
+    tag           REAL NOT NULL DEFAULT 0,   -- fair-queuing virtual finish time
+    status        TEXT NOT NULL,    -- "queued" | "running" | "done" | "error"
+    result        TEXT,
+    error         TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    enqueued_at   REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS broker_tasks_claim ON broker_tasks (status, enqueued_at);
+
+-- Fair-queuing state shared by all processes (see backend/scheduler.py):
+-- the last tag handed out per flow, and the virtual time (tag of the last
+-- claimed task).
+CREATE TABLE IF NOT EXISTS broker_flows (
+    priority  TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    last_tag  REAL NOT NULL,
+    PRIMARY KEY (priority, client_id)
+);
+CREATE TABLE IF NOT EXISTS broker_clock (
+    id    INTEGER PRIMARY KEY CHECK (id = 0),
+    vtime REAL NOT NULL
+);
+INSERT OR IGNORE INTO broker_clock (id, vtime) VALUES (0, 0);
+
+-- Append-only completion feed that every API process tails.
+CREATE TABLE IF NOT EXISTS broker_events (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id  TEXT NOT NULL,
+    status   TEXT NOT NULL,
+    result   TEXT,
+    error    TEXT,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS broker_workers (
+    owner          TEXT PRIMARY KEY,  -- "<host>:<pid>:<slot>"
+    pid            INTEGER NOT NULL,
+    slot           INTEGER NOT NULL,
+    busy           INTEGER NOT NULL DEFAULT 0,
+    current_task   TEXT,
+    tasks_done     INTEGER NOT NULL DEFAULT 0,
+    tasks_failed   INTEGER NOT NULL DEFAULT 0,
+    busy_seconds   REAL NOT NULL DEFAULT 0,
+    started_at     REAL NOT NULL,
+    last_heartbeat REAL NOT NULL
+);
+"""
+
+# Columns added after the first release; broker files created before them
+# get them on open.
+_ADDED_COLUMNS = (
+    ("priority", "TEXT NOT NULL DEFAULT 'interactive'"),
+    ("client_id", "TEXT NOT NULL DEFAULT 'anonymous'"),
+    ("tag", "REAL NOT NULL DEFAULT 0"),
+)
+
+
+class TaskBroker:
+    """
+    Task broker shared by API processes and out-of-process workers through
+    one local SQLite file (WAL mode), so agent execution can scale on its
+    own cores, independently of the HTTP tier.
+
+    Workers claim a task by taking a lease on it. While running they renew
+    the lease with heartbeat(); if a worker dies, its lease runs out and the
+    task becomes claimable again (up to `max_attempts` times). Completions
+    are appended to broker_events, which every API process tails to feed
+    its local event log.
+
+    Tasks are claimed in the same weighted fair order as FairScheduler:
+    each gets a virtual finish tag from its flow's (priority, client)
+    weight when submitted, and claim() takes the smallest tag.
+
+    Every method does blocking I/O: call it via asyncio.to_thread() from
+    async code.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=busy_timeout,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(broker_tasks)")}
+        for column, decl in _ADDED_COLUMNS:
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE broker_tasks ADD COLUMN {column} {decl}")
+                except sqlite3.OperationalError:
+                    # Another process opening the same file added it first.
+                    pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS broker_tasks_fair ON broker_tasks (status, tag)")
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- API side ----
+
+    def _tags(self, priority: str, client_id: str, weight: float, n: int) -> List[float]:
+        # n consecutive tags for one flow; call inside a write transaction.
+        (vtime,) = self._conn.execute("SELECT vtime FROM broker_clock WHERE id = 0").fetchone()
+        row = self._conn.execute(
+            "SELECT last_tag FROM broker_flows WHERE priority = ? AND client_id = ?",
+            (priority, client_id),
+        ).fetchone()
+        start = max(vtime, row[0] if row else 0.0)
+        tags = [start + (i + 1) / weight for i in range(n)]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO broker_flows (priority, client_id, last_tag) VALUES (?, ?, ?)",
+            (priority, client_id, tags[-1]),
+        )
+        return tags
+
+    def submit(
+        self,
+        task_id: str,
+        user_input: str,
+        priority: str = "interactive",
+        client_id: str = "anonymous",
+        weight: float = 1.0,
+    ):
+        self.submit_many([(task_id, user_input)], priority, client_id, weight)
+
+    def submit_many(
+        self,
+        items: List[Tuple[str, str]],
+        priority: str = "interactive",
+        client_id: str = "anonymous",
+        weight: float = 1.0,
+    ):
+        """
+        Submit (task_id, input) pairs of one flow in a single transaction.
+        `weight` is the flow's share (FairScheduler.weight()).
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tags = self._tags(priority, client_id, weight, len(items))
+                self._conn.executemany(
+                    "INSERT INTO broker_tasks "
+                    "(task_id, input, priority, client_id, tag, status, enqueued_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    [
+                        (task_id, user_input, priority, client_id, tag, now, now)
+                        for (task_id, user_input), tag in zip(items, tags)
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_status(self, task_id: str) -> Optional[TaskStatus]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error FROM broker_tasks WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return TaskStatus(task_id=task_id, status=row[0], result=row[1], error=row[2])
+
+    def last_event_seq(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM broker_events").fetchone()
+        return row[0]
+
+    def events_since(self, seq: int, limit: int = 1000) -> List[Tuple[int, TaskEvent]]:
+        """
+        (seq, event) pairs appended after `seq`. event_id is filled in by
+        the caller's own EventLog, so it is left at 0 here.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, task_id, status, result, error FROM broker_events "
+                "WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        return [
+            (s, TaskEvent(event_id=0, task_id=t, status=st, result=r, error=e))
+            for s, t, st, r, e in rows
+        ]
+
+    def cancel(self, task_id: str, error: str) -> bool:
+        """
+        Fail a queued or running task with `error`. A running task keeps its
+        lease owner, so the worker learns of it on its next heartbeat.
+        Returns False if the task is unknown or already finished.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE broker_tasks SET status = 'error', error = ?, updated_at = ? "
+                    "WHERE task_id = ? AND status IN ('queued', 'running')",
+                    (error, now, task_id),
+                )
+                cancelled = cur.rowcount == 1
+                if cancelled:
+                    self._conn.execute(
+                        "INSERT INTO broker_events (task_id, status, result, error, created_at) "
+                        "VALUES (?, 'error', NULL, ?, ?)",
+                        (task_id, error, now),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cancelled
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM broker_tasks WHERE status = 'queued'"
+            ).fetchone()
+        return row[0]
+
+    def worker_stats(self, stale_after: float = 60.0) -> List[WorkerStats]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT slot, pid, busy, current_task, tasks_done, tasks_failed, busy_seconds, started_at "
+                "FROM broker_workers WHERE last_heartbeat > ? ORDER BY owner",
+                (time.time() - stale_after,),
+            ).fetchall()
+        return [
+            WorkerStats(
+                worker_id=slot,
+                pid=pid,
+                busy=bool(busy),
+                current_task_id=current,
+                tasks_done=done,
+                tasks_failed=failed,
+                busy_seconds=busy_s,
+                started_at=started,
+            )
+            for slot, pid, busy, current, done, failed, busy_s, started in rows
+        ]
+
+    # ---- worker side ----
+
+    def register_worker(self, owner: str, slot: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO broker_workers (owner, pid, slot, started_at, last_heartbeat) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (owner, os.getpid(), slot, now, now),
+            )
+
+    def unregister_worker(self, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM broker_workers WHERE owner = ?", (owner,))
+
+    def claim(self, owner: str, lease_seconds: float) -> Optional[Tuple[str, str]]:
+        """
+        Lease the claimable task (queued, or running with an expired lease)
+        with the smallest fair-queuing tag to `owner`. Returns
+        (task_id, input) or None.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Give up on tasks whose lease expired too many times.
+                self._fail_exhausted(now)
+                row = self._conn.execute(
+                    "SELECT task_id, input FROM broker_tasks "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY tag, enqueued_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE broker_clock SET vtime = "
+                        "MAX(vtime, (SELECT tag FROM broker_tasks WHERE task_id = ?)) WHERE id = 0",
+                        (row[0],),
+                    )
+                    self._conn.execute(
+                        "UPDATE broker_tasks SET status = 'running', lease_owner = ?, "
+                        "lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                        "WHERE task_id = ?",
+                        (owner, now + lease_seconds, now, row[0]),
+                    )
+                    self._conn.execute(
+                        "UPDATE broker_workers SET busy = 1, current_task = ?, last_heartbeat = ? "
+                        "WHERE owner = ?",
+                        (row[0], now, owner),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _fail_exhausted(self, now: float):
+        rows = self._conn.execute(
+            "SELECT task_id FROM broker_tasks "
+            "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        ).fetchall()
+        for (task_id,) in rows:
+            error = f"Task abandoned after {self.max_attempts} expired leases"
+            self._conn.execute(
+                "UPDATE broker_tasks SET status = 'error', error = ?, lease_owner = NULL, "
+                "updated_at = ? WHERE task_id = ?",
+                (error, now, task_id),
+            )
+            self._conn.execute(
+                "INSERT INTO broker_events (task_id, status, result, error, created_at) "
+                "VALUES (?, 'error', NULL, ?, ?)",
+                (task_id, error, now),
+            )
+
+    def heartbeat(self, owner: str, lease_seconds: float) -> List[str]:
+        """
+        Renew the lease on every task `owner` is running. Returns the ids of
+        its tasks that were cancelled meanwhile, which it should stop.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE broker_tasks SET lease_expires = ? "
+                "WHERE lease_owner = ? AND status = 'running'",
+                (now + lease_seconds, owner),
+            )
+            cancelled = [
+                task_id for (task_id,) in self._conn.execute(
+                    "SELECT task_id FROM broker_tasks WHERE lease_owner = ? AND status != 'running'",
+                    (owner,),
+                )
+            ]
+            if cancelled:
+                self._conn.execute(
+                    "UPDATE broker_tasks SET lease_owner = NULL "
+                    "WHERE lease_owner = ? AND status != 'running'",
+                    (owner,),
+                )
+            self._conn.execute(
+                "UPDATE broker_workers SET last_heartbeat = ? WHERE owner = ?",
+                (now, owner),
+            )
+        return cancelled
+
+    def complete(
+        self,
+        owner: str,
+        task_id: str,
+        status: str,
+        result: str | None,
+        error: str | None,
+        busy_seconds: float,
+    ) -> bool:
+        """
+        Record the outcome of a leased task. Returns False (and records
+        nothing) if the lease was lost to another worker in the meantime.
+        """
+        now = time.time()
+        counter = "tasks_done" if status == "done" else "tasks_failed"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE broker_tasks SET status = ?, result = ?, error = ?, "
+                    "lease_owner = NULL, updated_at = ? "
+                    "WHERE task_id = ? AND lease_owner = ? AND status = 'running'",
+                    (status, result, error, now, task_id, owner),
+                )
+                owned = cur.rowcount == 1
+                if owned:
+                    self._conn.execute(
+                        "INSERT INTO broker_events (task_id, status, result, error, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (task_id, status, result, error, now),
+                    )
+                self._conn.execute(
+                    f"UPDATE broker_workers SET busy = 0, current_task = NULL, {counter} = {counter} + 1, "
+                    "busy_seconds = busy_seconds + ?, last_heartbeat = ? WHERE owner = ?",
+                    (busy_seconds, now, owner),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return owned
+
+    # ---- retention ----
+
+    def purge(self, older_than: float):
+        """
+        Delete finished tasks and feed entries older than `older_than`.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM broker_tasks WHERE status IN ('done', 'error') AND updated_at < ?",
+                (older_than,),
+            )
+            self._conn.execute("DELETE FROM broker_events WHERE created_at < ?", (older_than,))
+            # An idle flow's last tag is <= vtime, so it carries no state.
+            self._conn.execute(
+                "DELETE FROM broker_flows WHERE last_tag <= (SELECT vtime FROM broker_clock WHERE id = 0)"
+            )
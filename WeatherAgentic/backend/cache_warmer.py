@@ -0,0 +1,237 @@
+# backend/cache_warmer.py
+import asyncio
+import heapq
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from metrics import Counter
+from weather_api import lookup_listeners, refresh_weather, weather_cache
+from weather_cache import TTLCache
+
+# Re-fetch the most looked-up cities shortly before their weather cache
+# entries expire, so their lookups keep hitting the cache.
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM", "1") == "1"
+CACHE_WARM_TOP_K = int(os.getenv("CACHE_WARM_TOP_K", "20"))
+CACHE_WARM_BUDGET = float(os.getenv("CACHE_WARM_BUDGET", "60"))        # refreshes per minute
+CACHE_WARM_LEAD = float(os.getenv("CACHE_WARM_LEAD", "30"))            # seconds before expiry
+CACHE_WARM_JITTER = float(os.getenv("CACHE_WARM_JITTER", "15"))        # extra random lead, seconds
+CACHE_WARM_INTERVAL = float(os.getenv("CACHE_WARM_INTERVAL", "1.0"))
+# Popularity is a lookup count decaying with this half-life; cities below
+# CACHE_WARM_MIN_SCORE are not warmed even if they are in the top K.
+CACHE_WARM_HALF_LIFE = float(os.getenv("CACHE_WARM_HALF_LIFE", "600"))
+CACHE_WARM_MIN_SCORE = float(os.getenv("CACHE_WARM_MIN_SCORE", "2"))
+
+CACHE_WARM = Counter(
+    "weatheragent_cache_warm_total",
+    "Background weather refreshes: refreshed, failed, or deferred (due, but over the per-minute budget)",
+    ["outcome"],
+)
+
+
+class CityPopularity:
+    """
+    Exponentially decayed lookup counts per city. Scores are stored scaled
+    by 2**(t / half_life), so a lookup is one addition and ranking needs no
+    decay pass.
+    """
+
+    def __init__(
+        self,
+        half_life: float,
+        max_cities: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.half_life = half_life
+        self.max_cities = max_cities
+        self._clock = clock
+        self._t0 = clock()
+        # key -> [scaled score, city name as last asked]
+        self._scores: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _exponent(self, now: float) -> float:
+        return (now - self._t0) / self.half_life
+
+    def record(self, key: str, city: str):
+        exponent = self._exponent(self._clock())
+        if exponent > 512:
+            # Rebase before the scaled scores overflow.
+            scale = 2.0 ** -exponent
+            for entry in self._scores.values():
+                entry[0] *= scale
+            self._t0 = self._clock()
+            exponent = 0.0
+
+        entry = self._scores.get(key)
+        if entry is None:
+            entry = self._scores[key] = [0.0, city]
+        entry[0] += 2.0 ** exponent
+        entry[1] = city
+        # After counting this lookup, so the city just asked for is ranked
+        # on its new score rather than pruned at zero.
+        if len(self._scores) > self.max_cities:
+            self._prune()
+
+    def _prune(self):
+        # Keep the top three quarters so pruning is not needed on every new city.
+        keep = heapq.nlargest(self.max_cities * 3 // 4, self._scores.items(), key=lambda kv: kv[1][0])
+        self._scores = dict(keep)
+
+    def top(self, k: int) -> List[Tuple[str, str, float]]:
+        """
+        The k most popular cities as (key, city, decayed lookup count).
+        """
+        scale = 2.0 ** -self._exponent(self._clock())
+        best = heapq.nlargest(k, self._scores.items(), key=lambda kv: kv[1][0])
+        return [(key, city, score * scale) for key, (score, city) in best]
+
+
+class CacheWarmer:
+    """
+    Each interval, refreshes those of the top-K cities whose cache entry is
+    missing or expires within lead + a per-entry random jitter, spending at
+    most `budget_per_minute` refreshes (token bucket).
+    """
+
+    def __init__(
+        self,
+        cache: TTLCache,
+        refresh: Callable[[str], Awaitable[int]],
+        enabled: bool = CACHE_WARM_ENABLED,
+        top_k: int = CACHE_WARM_TOP_K,
+        budget_per_minute: float = CACHE_WARM_BUDGET,
+        lead: float = CACHE_WARM_LEAD,
+        jitter: float = CACHE_WARM_JITTER,
+        interval: float = CACHE_WARM_INTERVAL,
+        half_life: float = CACHE_WARM_HALF_LIFE,
+        min_score: float = CACHE_WARM_MIN_SCORE,
+    ):
+        self.enabled = enabled and top_k > 0 and budget_per_minute > 0
+        self.cache = cache
+        self.refresh = refresh
+        self.top_k = top_k
+        self.budget_per_minute = budget_per_minute
+        self.lead = lead
+        self.jitter = jitter
+        self.interval = interval
+        self.min_score = min_score
+        self.popularity = CityPopularity(half_life, max_cities=max(100, top_k * 20))
+
+        self._tokens = budget_per_minute
+        self._last_refill = time.monotonic()
+        # key -> (cache version, lead drawn for that version)
+        self._leads: Dict[str, Tuple[int, float]] = {}
+        self._refreshing: Set[str] = set()
+        self._deferred: Set[str] = set()
+        # key -> time before which a failed city is not retried
+        self._retry_at: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.counts = {"refreshed": 0, "failed": 0, "deferred": 0}
+
+    def _count(self, outcome: str):
+        self.counts[outcome] += 1
+        CACHE_WARM.inc(outcome)
+
+    def _lead_for(self, key: str, version: int) -> float:
+        # Drawn once per cached value: entries filled together (e.g. at
+        # startup) are then refreshed spread out, not in one burst.
+        drawn = self._leads.get(key)
+        if drawn is None or drawn[0] != version:
+            drawn = self._leads[key] = (version, self.lead + random.uniform(0, self.jitter))
+        return drawn[1]
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.budget_per_minute,
+            self._tokens + (now - self._last_refill) * self.budget_per_minute / 60,
+        )
+        self._last_refill = now
+
+    def due(self) -> List[Tuple[str, str]]:
+        """
+        (key, city) of the popular cities that need a refresh now, most
+        popular first.
+        """
+        due = []
+        now = time.monotonic()
+        top = self.popularity.top(self.top_k)
+        for key, city, score in top:
+            if score < self.min_score or key in self._refreshing or self._retry_at.get(key, 0) > now:
+                continue
+            remaining = self.cache.ttl_remaining(key)
+            if remaining is None or remaining <= self._lead_for(key, self.cache.version(key)):
+                due.append((key, city))
+
+        # Forget per-city state of cities that left the top K.
+        keys = {key for key, _, _ in top}
+        for state in (self._leads, self._retry_at):
+            for key in [k for k in state if k not in keys]:
+                del state[key]
+        self._deferred &= keys
+        return due
+
+    def tick(self):
+        self._refill()
+        for key, city in self.due():
+            if self._tokens < 1:
+                if key not in self._deferred:
+                    self._deferred.add(key)
+                    self._count("deferred")
+                continue
+            self._tokens -= 1
+            self._deferred.discard(key)
+            self._refreshing.add(key)
+            task = asyncio.create_task(self._refresh(key, city))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, city: str):
+        try:
+            await self.refresh(city)
+            self._count("refreshed")
+            self._retry_at.pop(key, None)
+        except Exception:
+            self._count("failed")
+            self._retry_at[key] = time.monotonic() + self.lead
+        finally:
+            self._refreshing.discard(key)
+            self._leads.pop(key, None)
+
+    async def run(self):
+        """
+        Track lookups and refresh popular cities until cancelled.
+        """
+        if not self.enabled:
+            return
+        lookup_listeners.append(self.popularity.record)
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                self.tick()
+        finally:
+            lookup_listeners.remove(self.popularity.record)
+            for task in self._tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "top_k": self.top_k,
+            "budget_per_minute": self.budget_per_minute,
+            "tokens": round(self._tokens, 2),
+            "tracked_cities": len(self.popularity),
+            "refreshing": len(self._refreshing),
+            **self.counts,
+            "top": [
+                {"city": city, "score": round(score, 2)}
+                for _, city, score in self.popularity.top(min(self.top_k, 10))
+            ],
+        }
+
+
+cache_warmer = CacheWarmer(weather_cache, refresh_weather)
@@ -0,0 +1,187 @@
+# backend/durable.py
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id     TEXT PRIMARY KEY,
+    input       TEXT NOT NULL,
+    priority    TEXT,
+    client_id   TEXT,
+    session_id  TEXT,
+    status      TEXT NOT NULL,      -- "queued" | "running" | "done" | "error"
+    result      TEXT,
+    error       TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_pending ON tasks (status, enqueued_at);
+"""
+
+# Columns added after the first release; journals created before them get
+# them on open().
+_ADDED_COLUMNS = ("priority", "client_id", "session_id")
+
+
+class SqliteTaskJournal:
+    """
+    Write-ahead record of task state in SQLite (WAL mode), so queued and
+    running tasks survive a restart of the API process.
+
+    The in-memory queue stays the source of truth while the process is up;
+    the journal only records transitions. Writes are buffered and committed
+    in batches (every `flush_interval` seconds or `batch_size` operations),
+    trading up to one flush interval of acknowledged tasks on a hard crash
+    for far fewer fsyncs. flush_interval=0 commits every write immediately.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 0.05,
+        batch_size: int = 256,
+        finished_ttl: float = 3600.0,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # Finished tasks are deleted from the journal after this many seconds.
+        self.finished_ttl = finished_ttl
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, tuple]] = []
+        self._lock = threading.Lock()
+
+        self.commits = 0
+        self.writes = 0
+
+    def open(self):
+        # check_same_thread=False: flushes run in a worker thread, one at a time.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        for column in _ADDED_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    # ---- recording (called from the event loop; never blocks on disk
+    #      unless batching is disabled or the batch is full) ----
+
+    def _write(self, sql: str, params: tuple):
+        self._pending.append((sql, params))
+        if self.flush_interval <= 0 or len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def record_enqueued(
+        self,
+        task_id: str,
+        user_input: str,
+        priority: str | None = None,
+        client_id: str | None = None,
+        session_id: str | None = None,
+    ):
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO tasks "
+            "(task_id, input, priority, client_id, session_id, status, enqueued_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (task_id, user_input, priority, client_id, session_id, now, now),
+        )
+
+    def record_running(self, task_id: str):
+        self._write(
+            "UPDATE tasks SET status = 'running', updated_at = ? WHERE task_id = ?",
+            (time.time(), task_id),
+        )
+
+    def record_finished(self, task_id: str, status: str, result: str | None, error: str | None):
+        self._write(
+            "UPDATE tasks SET status = ?, result = ?, error = ?, updated_at = ? WHERE task_id = ?",
+            (status, result, error, time.time(), task_id),
+        )
+
+    # ---- committing ----
+
+    def flush(self):
+        """
+        Commit every buffered write in one transaction.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch or self._conn is None:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in batch:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.commits += 1
+            self.writes += len(batch)
+
+    async def flush_loop(self, purge_interval: float = 60.0):
+        """
+        Background committer (and purger of old finished tasks); run it as
+        an asyncio task.
+        """
+        next_purge = time.monotonic() + purge_interval
+        while True:
+            await asyncio.sleep(self.flush_interval or 1.0)
+            if self._pending:
+                await asyncio.to_thread(self.flush)
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + purge_interval
+                await asyncio.to_thread(self.purge_finished, time.time() - self.finished_ttl)
+
+    # ---- recovery / retention ----
+
+    def recover(self) -> List[Tuple[str, str, Optional[str], Optional[str], Optional[str]]]:
+        """
+        Return (task_id, input, priority, client_id, session_id) for every task that was queued or running
+        when the process stopped, oldest first. Tasks that were running are
+        put back to "queued" so a worker picks them up again.
+        """
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, input, priority, client_id, session_id FROM tasks WHERE status IN ('queued', 'running') "
+                "ORDER BY enqueued_at"
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE tasks SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (time.time(),),
+            )
+        return rows
+
+    def purge_finished(self, older_than: float) -> int:
+        """
+        Delete finished tasks last updated before `older_than` (unix time).
+        """
+        self.flush()
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'error') AND updated_at < ?",
+                (older_than,),
+            )
+        return cur.rowcount
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending_writes": len(self._pending),
+            "writes": self.writes,
+            "commits": self.commits,
+        }
@@ -0,0 +1,154 @@
+# backend/fast_path.py
+import os
+import re
+from typing import Any, Dict, NamedTuple, Optional
+
+from gazetteer import default_gazetteer
+from metrics import Counter
+from tools import clothing_advice
+from weather_api import CITY_RESOLVER, get_current_condition
+
+# Answer plain "weather in <city>" / "what should I wear in <city>"
+# questions from a template, without the model.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "0") == "1"
+
+FAST_PATH = Counter(
+    "weatheragent_fast_path_total",
+    "Tasks seen by the fast-path router: hit (answered without the model), "
+    "miss (not a simple query) or error (weather fetch failed, left to the agent)",
+    ["outcome"],
+)
+
+
+class Intent(NamedTuple):
+    kind: str                 # "weather" | "clothing"
+    city: str
+    units: str                # "metric" | "imperial"
+    activity: Optional[str]
+
+
+_CITY = r"(?P<city>[a-z][a-z .'-]{0,40}?(?:, ?[a-z]{2,20})?)"
+_END = r"(?: (?:today|now|right now|currently))?[ ?.!]*$"
+_ACTIVITY = r"(?: for (?:a |an )?(?P<activity>walk|run|jog|hike|bike ride))?"
+
+_PATTERNS = [
+    ("weather", re.compile(
+        rf"^(?:what(?:'s| is) |how(?:'s| is) )?(?:the )?(?:current )?(?:weather|temperature|temp)"
+        rf"(?: like)?(?: right now)? (?:in|for|at) {_CITY}{_END}"
+    )),
+    ("weather", re.compile(rf"^{_CITY} weather{_END}")),
+    ("weather", re.compile(rf"^how (?:hot|cold|warm) is it (?:in|at) {_CITY}{_END}")),
+    ("clothing", re.compile(rf"^what should i wear{_ACTIVITY} (?:in|at) {_CITY}{_END}")),
+    ("clothing", re.compile(
+        rf"^do i need (?:a |an )?(?:jacket|coat|umbrella|sweater|raincoat){_ACTIVITY} (?:in|at) {_CITY}{_END}"
+    )),
+]
+
+_UNITS = re.compile(r" in (?:degrees )?(fahrenheit|celsius)\b")
+
+# Anything that points at another time, several places or a richer question
+# goes to the agent.
+_NOT_SIMPLE = {
+    "tomorrow", "tonight", "weekend", "week", "later", "yesterday", "next", "this",
+    "morning", "afternoon", "evening", "forecast", "and", "or", "vs", "versus", "compare",
+    "in", "at", "for", "near", "the", "my",
+}
+
+
+def classify(user_input: str) -> Optional[Intent]:
+    """
+    The intent of a simple weather / clothing question, or None if the
+    input is anything else (or not clearly one of those).
+    """
+    text = " ".join(user_input.lower().replace("’", "'").split())
+    units = "metric"
+    m = _UNITS.search(text)
+    if m:
+        units = "imperial" if m.group(1) == "fahrenheit" else "metric"
+        text = text[:m.start()] + text[m.end():]
+
+    for kind, pattern in _PATTERNS:
+        m = pattern.match(text)
+        if m is None:
+            continue
+        city = m.group("city").strip(" .'-")
+        words = city.replace(",", " ").split()
+        if not words or len(words) > 5 or _NOT_SIMPLE.intersection(words):
+            return None
+        activity = m.groupdict().get("activity")
+        return Intent(kind, _display_city(city), units, activity)
+    return None
+
+
+def _display_city(city: str) -> str:
+    name, _, region = city.partition(",")
+    name = " ".join(w.capitalize() for w in name.split())
+    region = region.strip()
+    if not region:
+        return name
+    return f"{name}, {region.upper() if len(region) <= 3 else region.title()}"
+
+
+def render(intent: Intent, current: Dict[str, Any]) -> str:
+    desc = current["weatherDesc"][0]["value"]
+    if intent.units == "metric":
+        temp, feels = f"{current['temp_C']}°C", f"{current['FeelsLikeC']}°C"
+    else:
+        temp, feels = f"{current['temp_F']}°F", f"{current['FeelsLikeF']}°F"
+
+    answer = (
+        f"Right now in {intent.city} it's {desc.lower()}, {temp} (feels like {feels}), "
+        f"with {current['humidity']}% humidity."
+    )
+    if intent.kind == "clothing":
+        answer += " " + clothing_advice(float(current["temp_C"]), desc, intent.activity)
+    return answer
+
+
+class FastPathRouter:
+    """
+    Answers simple queries by calling the weather API and the clothing
+    rules directly; everything else (and any fetch failure) is left to
+    weather_agent.
+    """
+
+    def __init__(self, enabled: bool = FAST_PATH_ENABLED):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def answer(self, user_input: str) -> Optional[str]:
+        intent = classify(user_input)
+        if intent is None:
+            self.misses += 1
+            FAST_PATH.inc("miss")
+            return None
+        try:
+            # As asked: "Paris, TX" must not become Paris, France.
+            current = await get_current_condition(intent.city)
+        except Exception:
+            self.errors += 1
+            FAST_PATH.inc("error")
+            return None
+        place = default_gazetteer().resolve(intent.city) if CITY_RESOLVER else None
+        if place is not None:
+            # "slc" -> "Salt Lake City" in the answer, keeping a region asked for
+            _, comma, region = intent.city.partition(",")
+            intent = intent._replace(city=place.name + comma + region)
+        self.hits += 1
+        FAST_PATH.inc("hit")
+        return render(intent, current)
+
+    def stats(self) -> Dict[str, Any]:
+        seen = self.hits + self.misses + self.errors
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / seen, 4) if seen else 0.0,
+        }
+
+
+fast_path = FastPathRouter()
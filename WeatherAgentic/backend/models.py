@@ -1,10 +1,21 @@
 # backend/models.py
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel
 
 
 class TaskRequest(BaseModel):
     input: str  # user message, e.g. "Weather in SLC?"
+    # "interactive" tasks are scheduled ahead of "batch" work
+    priority: Literal["interactive", "batch"] = "interactive"
+    # Tasks with the same session_id are turns of one conversation: each
+    # sees the earlier turns (and their tool results)
+    session_id: Optional[str] = None
+
+
+class BatchSubmitted(BaseModel):
+    batch_id: str
+    count: int
+    task_ids: List[str]   # in input order
 
 
 class TaskStatus(BaseModel):
@@ -24,3 +35,38 @@ class TaskEvent(BaseModel):
     status: str               # "done" | "error"
     result: Optional[str] = None
     error: Optional[str] = None
+
+
+class WorkerStats(BaseModel):
+    """
+    Per-worker counters, updated in place by worker_loop().
+    """
+    worker_id: int
+    pid: Optional[int] = None            # set for out-of-process workers
+    busy: bool = False
+    current_task_id: Optional[str] = None
+    tasks_done: int = 0
+    tasks_failed: int = 0
+    busy_seconds: float = 0.0
+    started_at: Optional[float] = None   # unix timestamp
+
+
+class WorkerPoolStats(BaseModel):
+    size: int
+    min_workers: int
+    max_workers: int
+    busy: int
+    queue_depth: int
+    workers: List[WorkerStats]
+
+
+class TraceSpan(BaseModel):
+    name: str                 # "enqueued", "dequeued", "model_call", "tool:get_weather", ...
+    start_ms: float           # offset from when the task was enqueued
+    duration_ms: Optional[float] = None   # None for point events
+    attrs: Optional[Dict[str, Any]] = None
+
+
+class TaskTrace(BaseModel):
+    task_id: str
+    spans: List[TraceSpan]
@@ -0,0 +1,147 @@
+# backend/prefetch.py
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import Counter
+from weather_api import cache_key, prefetch_weather, weather_cache
+
+from .fast_path import classify
+
+# Start fetching the weather for cities named in the question while the
+# model makes its first call, so get_weather usually finds it cached.
+PREFETCH_ENABLED = os.getenv("WEATHER_PREFETCH", "1") == "1"
+PREFETCH_MAX_CITIES = int(os.getenv("PREFETCH_MAX_CITIES", "2"))
+
+PREFETCH = Counter(
+    "weatheragent_prefetch_total",
+    "Speculative weather fetches: used (the agent asked for that city), "
+    "wasted (it did not), failed, or skipped (already cached)",
+    ["outcome"],
+)
+
+_TOKEN = re.compile(r"[^\W\d_][\w.'-]*|[,?!;:]")
+_PREPS = {"in", "for", "at", "and", "or", "vs", "vs."}
+
+# Words that end a candidate place name.
+_STOP = {
+    "today", "tonight", "tomorrow", "now", "right", "currently", "later", "this", "next",
+    "the", "a", "an", "my", "our", "general", "in", "at", "for", "and", "or", "vs", "with",
+    "please", "morning", "afternoon", "evening", "weekend", "week", "fahrenheit", "celsius",
+    "degrees", "i", "we", "it", "what", "how", "should", "do", "is", "be",
+}
+
+
+def likely_cities(user_input: str, limit: int) -> List[str]:
+    """
+    Place names the agent will probably look up: the city of a fast-path
+    pattern, else up to four words after "in"/"for"/"at"/"and"
+    (capitalized ones only, if the input uses capitals at all).
+    """
+    intent = classify(user_input)
+    if intent is not None:
+        return [intent.city][:limit]
+
+    tokens = _TOKEN.findall(user_input)
+    cased = any(t[0].isupper() for t in tokens if t != "I")
+    cities: List[str] = []
+    keys = set()
+    for i, token in enumerate(tokens):
+        if token.lower() not in _PREPS:
+            continue
+        words = []
+        for word in tokens[i + 1:i + 5]:
+            bare = word.rstrip(".")
+            if not bare[0].isalpha() or bare.lower() in _STOP or (cased and not bare[0].isupper()):
+                break
+            words.append(bare if len(bare) > 3 else word)
+            if word.endswith(".") and len(bare) > 3:
+                break
+        if not words:
+            continue
+        j = i + 1 + len(words)
+        # "Portland, OR": keep a region after a comma.
+        if j + 1 < len(tokens) and tokens[j] == "," and len(tokens[j + 1]) == 2:
+            words[-1] += ","
+            words.append(tokens[j + 1])
+        city = " ".join(words)
+        if cache_key(city) not in keys:
+            keys.add(cache_key(city))
+            cities.append(city)
+            if len(cities) >= limit:
+                break
+    return cities
+
+
+async def _fetch(city: str) -> bool:
+    try:
+        await prefetch_weather(city)
+        return True
+    except Exception:
+        return False
+
+
+class Prefetcher:
+    """
+    Speculative weather fetches for one agent run at a time: start() before
+    the run, settle() with the run's weather lookups afterwards.
+    """
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, max_cities: int = PREFETCH_MAX_CITIES):
+        self.enabled = enabled and max_cities > 0
+        self.max_cities = max_cities
+        self.counts = {"used": 0, "wasted": 0, "failed": 0, "skipped": 0}
+
+    def _count(self, outcome: str):
+        self.counts[outcome] += 1
+        PREFETCH.inc(outcome)
+
+    def start(self, user_input: str) -> List[Tuple[str, "asyncio.Task[bool]"]]:
+        """
+        Fetch the weather for the cities in user_input in the background;
+        returns (city key, fetch task) pairs. Must be called outside the
+        run's weather_deps context, so the fetches are not recorded as
+        lookups of the run.
+        """
+        if not self.enabled:
+            return []
+        pending = []
+        for city in likely_cities(user_input, self.max_cities):
+            key = cache_key(city)
+            if weather_cache.version(key) is not None:
+                self._count("skipped")
+                continue
+            pending.append((key, asyncio.create_task(_fetch(city))))
+        return pending
+
+    def settle(
+        self,
+        pending: List[Tuple[str, "asyncio.Task[bool]"]],
+        deps: Optional[List[Tuple[str, Optional[int]]]],
+    ):
+        """
+        Count each fetch as used or wasted given the weather lookups the
+        run made, and stop waiting for the ones still running.
+        """
+        looked_up = {key for key, _ in deps or ()}
+        for key, fetch in pending:
+            if fetch.done() and not fetch.result():
+                self._count("failed")
+            elif key in looked_up:
+                self._count("used")
+            else:
+                self._count("wasted")
+            # The cache load itself is shielded; this only drops our wait.
+            fetch.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        settled = self.counts["used"] + self.counts["wasted"]
+        return {
+            "enabled": self.enabled,
+            **self.counts,
+            "use_rate": round(self.counts["used"] / settled, 4) if settled else 0.0,
+        }
+
+
+prefetcher = Prefetcher()
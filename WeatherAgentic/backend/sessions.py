@@ -0,0 +1,130 @@
+# backend/sessions.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _trim_turns(items: List[Any], max_items: int) -> List[Any]:
+    """
+    Drop the oldest whole turns (from one user message to the next) until
+    at most max_items remain, so a tool call is never separated from its
+    output.
+    """
+    if len(items) <= max_items:
+        return items
+    for i, item in enumerate(items):
+        if isinstance(item, dict) and item.get("role") == "user" and len(items) - i <= max_items:
+            return items[i:]
+    # A single turn larger than the limit: keep just the latest turn.
+    starts = [i for i, item in enumerate(items) if isinstance(item, dict) and item.get("role") == "user"]
+    return items[starts[-1]:] if starts else items
+
+
+class Session:
+    """
+    Conversation state of one session: either the prior turns as Responses
+    input items ("history" mode), or just the id of the last model
+    response ("response_id" mode, the model provider keeps the context).
+    """
+
+    __slots__ = ("items", "last_response_id", "last_used", "turns", "lock")
+
+    def __init__(self, now: float):
+        self.items: List[Any] = []
+        self.last_response_id: Optional[str] = None
+        self.last_used = now
+        self.turns = 0
+        # Turns of one session run one at a time, each seeing the last.
+        self.lock = asyncio.Lock()
+
+
+class SessionStore:
+    """
+    Sessions by id, at most `max_sessions` (least recently used evicted
+    first), each forgotten `ttl` seconds after its last turn and holding
+    at most `max_items` history items.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_sessions: int,
+        max_items: int,
+        mode: str = "history",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if mode not in ("history", "response_id"):
+            raise ValueError(f"Unknown session mode {mode!r}")
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_items = max_items
+        self.mode = mode
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Session:
+        """
+        The session with this id, or a new empty one.
+        """
+        now = self._clock()
+        self._drop_expired(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _drop_expired(self, now: float):
+        # LRU order is last-use order, so expired sessions are at the front.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl or session.lock.locked():
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def run_args(self, session: Session, user_input: str) -> Tuple[Any, Dict[str, Any]]:
+        """
+        (input, extra Runner.run kwargs) for the next turn of a session.
+        """
+        if self.mode == "response_id":
+            if session.last_response_id:
+                return user_input, {"previous_response_id": session.last_response_id}
+            return user_input, {}
+        return session.items + [{"role": "user", "content": user_input}], {}
+
+    def record(self, session: Session, result: Any):
+        """
+        Remember a finished turn (a RunResult or RunResultStreaming).
+        """
+        session.turns += 1
+        session.last_used = self._clock()
+        if self.mode == "response_id":
+            session.last_response_id = result.last_response_id
+        else:
+            session.items = _trim_turns(result.to_input_list(), self.max_items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "history_items": sum(len(s.items) for s in self._sessions.values()),
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
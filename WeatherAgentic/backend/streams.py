@@ -0,0 +1,101 @@
+# backend/streams.py
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+# (kind, data): kind is "delta" (a piece of answer text), "tool_call"
+# ({"tool", "arguments"}) or "tool_output" (the tool's text result).
+Chunk = Tuple[str, Any]
+
+
+class TaskStream:
+    """
+    Output of one running task, in the order the agent produced it. Every
+    subscriber reads it from the start, so late subscribers replay what
+    they missed.
+    """
+
+    __slots__ = ("chunks", "closed", "_changed")
+
+    def __init__(self):
+        self.chunks: List[Chunk] = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake every current waiter; later ones wait on the fresh event.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, kind: str, data: Any):
+        if self.closed:
+            return
+        self.chunks.append((kind, data))
+        self._notify()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._notify()
+
+    async def wait(self, after: int, timeout: float) -> List[Chunk]:
+        """
+        Chunks past index `after`, waiting up to `timeout` seconds for one
+        if there are none yet. Returns [] on timeout or once closed.
+        """
+        if len(self.chunks) <= after and not self.closed:
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.chunks[after:]
+
+
+class StreamRegistry:
+    """
+    Streams of unfinished tasks. A coalesced task is an alias for its
+    leader's stream, since the leader's run produces its answer too.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, TaskStream] = {}
+        self._alias: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def open(self, task_id: str) -> TaskStream:
+        task_id = self._alias.get(task_id, task_id)
+        stream = self._streams.get(task_id)
+        if stream is None:
+            stream = self._streams[task_id] = TaskStream()
+        return stream
+
+    def get(self, task_id: str) -> Optional[TaskStream]:
+        return self._streams.get(self._alias.get(task_id, task_id))
+
+    def alias(self, task_id: str, leader: str):
+        self._alias[task_id] = leader
+
+    def wake(self, task_id: str):
+        """
+        Wake the subscribers of task_id's stream without ending it, so they
+        notice the task itself finished while the run goes on.
+        """
+        stream = self.get(task_id)
+        if stream is not None:
+            stream._notify()
+
+    def close(self, task_id: str):
+        """
+        The task finished: end its stream for subscribers and forget it.
+        A coalesced task only drops its alias; the run may still be
+        answering others.
+        """
+        if task_id in self._alias:
+            self.wake(task_id)
+            del self._alias[task_id]
+            return
+        stream = self._streams.pop(task_id, None)
+        if stream is not None:
+            stream.close()
@@ -1,31 +1,799 @@
 # backend/task_queue.py
 import asyncio
-from typing import Dict, List
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+from metrics import CallbackMetric, Histogram
+
+from .admission import AdmissionController
+from .broker import TaskBroker
+from .durable import SqliteTaskJournal
 from .models import TaskStatus, TaskEvent
+from .scheduler import FairScheduler
+from .sessions import SessionStore
+from .streams import StreamRegistry
+from .tracing import TraceStore
+
+# How many of the most recent events /events can still return.
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "10000"))
+
+# Retention for finished tasks (active tasks are never evicted).
+TASK_TTL = float(os.getenv("TASK_TTL", "3600"))
+TASK_MAX_FINISHED = int(os.getenv("TASK_MAX_FINISHED", "10000"))
+TASK_MAX_RESULT_BYTES = int(os.getenv("TASK_MAX_RESULT_BYTES", str(50 * 1024 * 1024)))
+TASK_SWEEP_INTERVAL = float(os.getenv("TASK_SWEEP_INTERVAL", "30"))
+
+# Scheduling weights: an interactive task is worth this many batch tasks.
+# SCHED_CLIENT_WEIGHTS ("client=weight,...") gives chosen clients a larger
+# or smaller share than the default 1.0.
+SCHED_WEIGHT_INTERACTIVE = float(os.getenv("SCHED_WEIGHT_INTERACTIVE", "8"))
+SCHED_WEIGHT_BATCH = float(os.getenv("SCHED_WEIGHT_BATCH", "1"))
+SCHED_CLIENT_WEIGHTS = os.getenv("SCHED_CLIENT_WEIGHTS", "")
+
+# Admission control: 0 disables a limit. Depth limits are per priority
+# class, so a large batch backlog never causes 429s for interactive users.
+TASK_QUEUE_MAX_DEPTH = int(os.getenv("TASK_QUEUE_MAX_DEPTH", "1000"))
+TASK_QUEUE_MAX_BATCH_DEPTH = int(os.getenv("TASK_QUEUE_MAX_BATCH_DEPTH", "100000"))
+CLIENT_MAX_INFLIGHT = int(os.getenv("CLIENT_MAX_INFLIGHT", "20"))
+
+# Attach tasks whose (normalized) input matches a queued or running task to
+# that task's execution instead of running the agent again.
+COALESCE_INPUTS = os.getenv("COALESCE_INPUTS", "1") == "1"
+
+# Batch submission limits
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "10000"))
+BATCH_MAX_TRACKED = int(os.getenv("BATCH_MAX_TRACKED", "1000"))
+
+# Per-task execution traces: how many to keep, and an optional JSON-lines
+# file every finished task's spans are appended to.
+TRACE_MAX_TASKS = int(os.getenv("TRACE_MAX_TASKS", "10000"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# Conversation sessions (TaskRequest.session_id). SESSION_MODE "history"
+# replays prior turns (incl. tool results) as input; "response_id" passes
+# the previous OpenAI response id instead and keeps nothing but that id.
+SESSION_MODE = os.getenv("SESSION_MODE", "history")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_MAX_ITEMS = int(os.getenv("SESSION_MAX_ITEMS", "40"))
+
+# Optional durable journal: set TASK_DB_PATH to keep queued/running tasks
+# across restarts.
+TASK_DB_PATH = os.getenv("TASK_DB_PATH")
+TASK_DB_FLUSH_INTERVAL = float(os.getenv("TASK_DB_FLUSH_INTERVAL", "0.05"))
+TASK_DB_BATCH_SIZE = int(os.getenv("TASK_DB_BATCH_SIZE", "256"))
+
+# "inprocess": workers run inside the API process and share task_queue.
+# "external": tasks go through a SQLite broker at TASK_DB_PATH and are run by
+#             separate `python -m backend.worker` processes.
+WORKER_MODE = os.getenv("WORKER_MODE", "inprocess")
+BROKER_POLL_INTERVAL = float(os.getenv("BROKER_POLL_INTERVAL", "0.05"))
+
+if WORKER_MODE not in ("inprocess", "external"):
+    raise RuntimeError(f"Unknown WORKER_MODE {WORKER_MODE!r}")
+if WORKER_MODE == "external" and not TASK_DB_PATH:
+    raise RuntimeError("WORKER_MODE=external requires TASK_DB_PATH")
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, weight = part.partition("=")
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+QUEUE_WAIT = Histogram(
+    "weatheragent_queue_wait_seconds",
+    "Time from enqueue until a worker picks the task up",
+    ["priority"],
+)
+TASK_LATENCY = Histogram(
+    "weatheragent_task_latency_seconds",
+    "Time from enqueue until the task's done/error event is emitted",
+    ["status"],
+)
+
+# Async task queue (purple box in the diagram): fair-share scheduler with
+# interactive / batch priority classes
+task_queue = FairScheduler(
+    class_weights={
+        "interactive": SCHED_WEIGHT_INTERACTIVE,
+        "batch": SCHED_WEIGHT_BATCH,
+    },
+    client_weights=_parse_weights(SCHED_CLIENT_WEIGHTS),
+    on_dequeue=lambda priority, wait: QUEUE_WAIT.observe(wait, priority),
+)
+
+# task_id -> time.monotonic() at enqueue, for TASK_LATENCY
+_enqueued_at: Dict[str, float] = {}
+
+traces = TraceStore(max_tasks=TRACE_MAX_TASKS, export_path=TRACE_EXPORT_PATH)
+
+sessions = SessionStore(
+    ttl=SESSION_TTL,
+    max_sessions=SESSION_MAX,
+    max_items=SESSION_MAX_ITEMS,
+    mode=SESSION_MODE,
+)
+
+# Live output of running tasks, for GET /tasks/{task_id}/stream
+streams = StreamRegistry()
+
+# Compact record kept for a finished task: (status, result, error, finished_at)
+_FinishedTask = Tuple[str, Optional[str], Optional[str], float]
+
+
+def _text_bytes(*values: str | None) -> int:
+    return sum(len(v.encode("utf-8")) for v in values if v)
+
+
+class TaskStore:
+    """
+    In-memory task store by id, bounded for long-running backends.
+
+    Queued / running tasks are live TaskStatus objects that the worker
+    updates in place. finish() turns them into a compact tuple kept in
+    completion order, from which they are evicted once older than `ttl`,
+    or oldest-first while there are more than `max_finished` of them or
+    their results exceed `max_result_bytes` in total.
+    """
+
+    def __init__(
+        self,
+        ttl: float = TASK_TTL,
+        max_finished: int = TASK_MAX_FINISHED,
+        max_result_bytes: int = TASK_MAX_RESULT_BYTES,
+        clock=time.time,
+    ):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self._clock = clock
+
+        self._active: Dict[str, TaskStatus] = {}
+        self._finished: "OrderedDict[str, _FinishedTask]" = OrderedDict()
+        self._result_bytes = 0
+
+        self.evicted_ttl = 0
+        self.evicted_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._finished)
+
+    @property
+    def active_count(self) -> int:
+        """
+        Number of queued + running tasks.
+        """
+        return len(self._active)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._active or task_id in self._finished
+
+    def add(self, task: TaskStatus):
+        self._active[task.task_id] = task
 
-# Async task queue (purple box in the diagram)
-task_queue: asyncio.Queue = asyncio.Queue()
+    def get(self, task_id: str) -> Optional[TaskStatus]:
+        task = self._active.get(task_id)
+        if task is not None:
+            return task
+        rec = self._finished.get(task_id)
+        if rec is None:
+            return None
+        status, result, error, _ = rec
+        return TaskStatus(task_id=task_id, status=status, result=result, error=error)
+
+    def __getitem__(self, task_id: str) -> TaskStatus:
+        task = self.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def finish(self, task_id: str, status: str, result: str | None, error: str | None):
+        """
+        Record a task's final state and move it to the compact finished set.
+        """
+        task = self._active.pop(task_id, None)
+        if task is not None:
+            # Anyone still holding the live object sees the final state too.
+            task.status, task.result, task.error = status, result, error
+
+        old = self._finished.pop(task_id, None)
+        if old is not None:
+            self._result_bytes -= _text_bytes(old[1], old[2])
+
+        self._finished[task_id] = (status, result, error, self._clock())
+        self._result_bytes += _text_bytes(result, error)
+        self._evict_over_capacity()
+
+    def _pop_oldest(self):
+        _, (_, result, error, _) = self._finished.popitem(last=False)
+        self._result_bytes -= _text_bytes(result, error)
+
+    def _evict_over_capacity(self):
+        while self._finished and (
+            len(self._finished) > self.max_finished
+            or self._result_bytes > self.max_result_bytes
+        ):
+            self._pop_oldest()
+            self.evicted_capacity += 1
+
+    def sweep(self) -> int:
+        """
+        Drop finished tasks older than the TTL. Returns how many were removed.
+        """
+        cutoff = self._clock() - self.ttl
+        removed = 0
+        # Completion order == age order, so stop at the first young entry.
+        while self._finished:
+            finished_at = next(iter(self._finished.values()))[3]
+            if finished_at > cutoff:
+                break
+            self._pop_oldest()
+            removed += 1
+        self.evicted_ttl += removed
+        return removed
+
+    async def sweep_loop(self, interval: float = TASK_SWEEP_INTERVAL):
+        """
+        Background sweeper; run it as an asyncio task.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._active),
+            "finished": len(self._finished),
+            "result_bytes": self._result_bytes,
+            "ttl_seconds": self.ttl,
+            "max_finished": self.max_finished,
+            "max_result_bytes": self.max_result_bytes,
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_capacity": self.evicted_capacity,
+        }
+
+
+tasks = TaskStore()
+
+admission = AdmissionController(
+    max_depth=TASK_QUEUE_MAX_DEPTH,
+    max_per_client=CLIENT_MAX_INFLIGHT,
+    max_batch_depth=TASK_QUEUE_MAX_BATCH_DEPTH,
+)
+
+broker: Optional[TaskBroker] = (
+    TaskBroker(TASK_DB_PATH) if WORKER_MODE == "external" else None
+)
+
+# The broker is durable on its own; the journal is only for in-process mode.
+journal: Optional[SqliteTaskJournal] = (
+    SqliteTaskJournal(
+        TASK_DB_PATH,
+        flush_interval=TASK_DB_FLUSH_INTERVAL,
+        batch_size=TASK_DB_BATCH_SIZE,
+        finished_ttl=TASK_TTL,
+    )
+    if TASK_DB_PATH and broker is None
+    else None
+)
+
+
+class EventLog:
+    """
+    Fixed-size ring buffer of TaskEvents indexed by their monotonic event_id.
+
+    Event n lives in slot n % capacity, so a read of everything after a
+    cursor touches only the new events, and memory never grows past
+    `capacity` events. Reads are not destructive: any number of clients
+    can follow the log with their own cursor.
+    """
+
+    def __init__(self, capacity: int = EVENT_LOG_SIZE):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self._slots: List[Optional[TaskEvent]] = [None] * capacity
+        self._next_id = 1
+        # Set (and replaced) on every append to wake waiters.
+        self._changed = asyncio.Event()
+
+    @property
+    def last_event_id(self) -> int:
+        """
+        Id of the newest event (0 if none yet).
+        """
+        return self._next_id - 1
+
+    @property
+    def first_event_id(self) -> int:
+        """
+        Id of the oldest event still retained.
+        """
+        return max(1, self._next_id - self.capacity)
+
+    def __len__(self) -> int:
+        return self._next_id - self.first_event_id
+
+    def append(
+        self,
+        task_id: str,
+        status: str,
+        result: str | None,
+        error: str | None,
+    ) -> TaskEvent:
+        ev = TaskEvent(
+            event_id=self._next_id,
+            task_id=task_id,
+            status=status,
+            result=result,
+            error=error,
+        )
+        self._slots[ev.event_id % self.capacity] = ev
+        self._next_id += 1
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return ev
+
+    def read(
+        self,
+        after: int = 0,
+        task_id: str | None = None,
+        limit: int | None = None,
+    ) -> List[TaskEvent]:
+        """
+        Events with event_id > after (oldest first), optionally only those
+        for one task. Events that already fell out of the buffer are skipped.
+        """
+        out: List[TaskEvent] = []
+        for event_id in range(max(after + 1, self.first_event_id), self._next_id):
+            ev = self._slots[event_id % self.capacity]
+            if task_id is not None and ev.task_id != task_id:
+                continue
+            out.append(ev)
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    async def wait(
+        self,
+        after: int = 0,
+        task_id: str | None = None,
+        timeout: float | None = None,
+        limit: int | None = None,
+    ) -> List[TaskEvent]:
+        """
+        Like read(), but if there is nothing new yet, sleep until append()
+        adds a matching event or `timeout` seconds pass (then return []).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while True:
+            evs = self.read(after=after, task_id=task_id, limit=limit)
+            if evs:
+                return evs
+            # Nothing matched up to here; only look at newer events next time.
+            after = max(after, self.last_event_id)
+
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return []
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
 
-# In-memory task store by id
-tasks: Dict[str, TaskStatus] = {}
 
 # In-memory event stream (for /events)
-events: List[TaskEvent] = []
-_next_event_id: int = 1
+event_log = EventLog()
+
+def normalize_input(user_input: str) -> str:
+    """
+    Case-, whitespace- and trailing-punctuation-insensitive form of a user
+    message, used to spot identical questions.
+    """
+    return " ".join(user_input.lower().split()).rstrip("?!. ")
+
+
+class Coalescer:
+    """
+    Tracks which queued / running task ("leader") is answering each
+    normalized input, and which later tasks ("followers") asked the same
+    thing and are waiting for that one result.
+    """
+
+    def __init__(self):
+        self._leader_by_key: Dict[str, str] = {}
+        self._key_by_leader: Dict[str, str] = {}
+        self._followers: Dict[str, List[str]] = {}
+        self._leader_of: Dict[str, str] = {}
+        # leader -> priority class it is queued under
+        self._priority: Dict[str, str] = {}
+        self.coalesced = 0
+
+    def attach(self, task_id: str, user_input: str, priority: str) -> Optional[str]:
+        """
+        Make task_id follow the in-flight task with the same input and
+        return that leader's id, or register task_id as the leader for its
+        input (queued under `priority`) and return None.
+        """
+        key = normalize_input(user_input)
+        leader = self._leader_by_key.get(key)
+        if leader is not None:
+            self._followers[leader].append(task_id)
+            self._leader_of[task_id] = leader
+            self.coalesced += 1
+            return leader
+        self._leader_by_key[key] = task_id
+        self._key_by_leader[task_id] = key
+        self._followers[task_id] = []
+        self._priority[task_id] = priority
+        return None
+
+    def followers(self, leader: str) -> List[str]:
+        return self._followers.get(leader, [])
+
+    def priority(self, leader: str) -> Optional[str]:
+        return self._priority.get(leader)
+
+    def set_priority(self, leader: str, priority: str):
+        if leader in self._priority:
+            self._priority[leader] = priority
+
+    def release(self, leader: str) -> List[str]:
+        """
+        Leader finished: forget its input and return its followers.
+        """
+        key = self._key_by_leader.pop(leader, None)
+        if key is not None:
+            del self._leader_by_key[key]
+        self._priority.pop(leader, None)
+        followers = self._followers.pop(leader, [])
+        for tid in followers:
+            del self._leader_of[tid]
+        return followers
+
+    def detach(self, task_id: str) -> Optional[str]:
+        """
+        Stop task_id from following its leader (it was cancelled) and return
+        that leader's id, or None if task_id is not a follower.
+        """
+        leader = self._leader_of.pop(task_id, None)
+        if leader is not None:
+            self._followers[leader].remove(task_id)
+        return leader
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": COALESCE_INPUTS,
+            "coalesced": self.coalesced,
+            "inflight_inputs": len(self._leader_by_key),
+            "waiting_followers": sum(len(f) for f in self._followers.values()),
+        }
+
+
+coalescer = Coalescer()
+
+CANCELLED = "Task cancelled"
+
+# task_id -> asyncio.Task running its agent (registered by the worker), so
+# cancel_task() can stop it
+runs: Dict[str, asyncio.Task] = {}
+
+# Tasks already finished by cancel_task() whose agent run is still queued
+# or running; when it reports, complete_task() skips the task itself and
+# only answers the tasks coalesced onto it.
+_detached: set = set()
+
+# batch_id -> task ids in submission order (most recent BATCH_MAX_TRACKED)
+batches: "OrderedDict[str, List[str]]" = OrderedDict()
 
 
 def add_event(task_id: str, status: str, result: str | None, error: str | None):
     """
-    Append a new event to the in-memory event list.
+    Append a new event to the in-memory event log.
     """
-    global _next_event_id
-    ev = TaskEvent(
-        event_id=_next_event_id,
-        task_id=task_id,
-        status=status,
-        result=result,
-        error=error,
-    )
-    events.append(ev)
-    _next_event_id += 1
+    enqueued_at = _enqueued_at.pop(task_id, None)
+    if enqueued_at is not None:
+        TASK_LATENCY.observe(time.monotonic() - enqueued_at, status)
+    ev = event_log.append(task_id, status, result, error)
+    traces.mark(task_id, "event_emitted", {"status": status, "event_id": ev.event_id})
+    traces.finish(task_id)
+    if task_id in _detached:
+        streams.wake(task_id)
+    else:
+        streams.close(task_id)
+    return ev
+
+
+# ============================
+#   TASK LIFECYCLE
+# ============================
+
+def queue_depth(priority: str | None = None) -> int:
+    """
+    Tasks waiting to be picked up (of one priority class, if given). In
+    external mode only this process's unfinished tasks are known locally.
+    """
+    if broker is not None:
+        return tasks.active_count
+    if priority is None:
+        return task_queue.qsize()
+    return task_queue.class_size(priority)
+
+
+def _queue_or_coalesce(
+    task_id: str,
+    user_input: str,
+    client_id: str,
+    priority: str | None,
+    session_id: str | None = None,
+):
+    priority = priority or task_queue.default_class
+    # A session turn's answer depends on the conversation so far, so it is
+    # never shared with another task.
+    leader = None
+    if COALESCE_INPUTS and session_id is None:
+        leader = coalescer.attach(task_id, user_input, priority)
+    if leader is None:
+        task_queue.put_nowait((task_id, user_input, session_id), client_id=client_id, priority=priority)
+        return
+    traces.mark(task_id, "coalesced", {"leader_task_id": leader})
+    streams.alias(task_id, leader)
+    # An interactive task must not wait behind the batch backlog of the
+    # task it follows: move a still-queued leader up to its class.
+    weights = task_queue.class_weights
+    if weights[priority] > weights[coalescer.priority(leader) or priority]:
+        if task_queue.promote(lambda item: item[0] == leader, priority):
+            coalescer.set_priority(leader, priority)
+            traces.mark(leader, "promoted", {"priority": priority, "by_task_id": task_id})
+
+
+async def enqueue_task(
+    task_id: str,
+    user_input: str,
+    client_id: str = "anonymous",
+    priority: str = "interactive",
+    session_id: str | None = None,
+) -> TaskStatus:
+    """
+    Register a new task and put it on the queue (or hand it to the broker).
+
+    Raises AdmissionRejected if the queue is full or the client already has
+    too many unfinished tasks.
+    """
+    admission.admit(task_id, client_id, queue_depth(priority))
+
+    task = TaskStatus(task_id=task_id, status="queued")
+    tasks.add(task)
+    _enqueued_at[task_id] = time.monotonic()
+    traces.start(task_id)
+    if broker is not None:
+        priority = priority or task_queue.default_class
+        await asyncio.to_thread(
+            broker.submit, task_id, user_input, priority, client_id, task_queue.weight(priority, client_id)
+        )
+        return task
+    if journal is not None:
+        journal.record_enqueued(task_id, user_input, priority, client_id, session_id)
+    _queue_or_coalesce(task_id, user_input, client_id, priority, session_id)
+    return task
+
+
+async def enqueue_batch(
+    inputs: List[str],
+    client_id: str = "anonymous",
+    priority: str = "batch",
+) -> Tuple[str, List[str]]:
+    """
+    Enqueue many inputs in one shot; returns (batch_id, task_ids).
+
+    Task ids are "<batch_id>-<index>", so a batch costs one uuid4, and the
+    whole batch is admitted or rejected (AdmissionRejected) as a unit.
+    """
+    batch_id = uuid.uuid4().hex
+    task_ids = [f"{batch_id}-{i}" for i in range(len(inputs))]
+    admission.admit_batch(task_ids, client_id, queue_depth(priority))
+
+    now = time.monotonic()
+    for task_id in task_ids:
+        # Fields are known-good; skip pydantic validation per task.
+        tasks.add(TaskStatus.model_construct(task_id=task_id, status="queued", result=None, error=None))
+        _enqueued_at[task_id] = now
+        traces.start(task_id)
+
+    if broker is not None:
+        await asyncio.to_thread(
+            broker.submit_many,
+            list(zip(task_ids, inputs)),
+            priority,
+            client_id,
+            task_queue.weight(priority, client_id),
+        )
+    else:
+        for task_id, user_input in zip(task_ids, inputs):
+            if journal is not None:
+                journal.record_enqueued(task_id, user_input, priority, client_id)
+            _queue_or_coalesce(task_id, user_input, client_id, priority)
+
+    batches[batch_id] = task_ids
+    while len(batches) > BATCH_MAX_TRACKED:
+        batches.popitem(last=False)
+    return batch_id, task_ids
+
+
+async def lookup_task(task_id: str) -> Optional[TaskStatus]:
+    """
+    Task status from the local store, falling back to the broker for tasks
+    accepted by another API process.
+    """
+    task = tasks.get(task_id)
+    if task is None and broker is not None:
+        task = await asyncio.to_thread(broker.get_status, task_id)
+    return task
+
+
+def mark_running(task_id: str):
+    own = () if task_id in _detached else (task_id,)
+    for tid in (*own, *coalescer.followers(task_id)):
+        tasks[tid].status = "running"
+        if journal is not None:
+            journal.record_running(tid)
+
+
+def _finish(task_id: str, status: str, result: str | None, error: str | None, completed: bool = False):
+    # completed: this finish ends a successful agent run, and counts towards
+    # the service rate (once per run, not per task coalesced onto it).
+    tasks.finish(task_id, status, result, error)
+    admission.release(task_id, completed=completed)
+    if journal is not None:
+        journal.record_finished(task_id, status, result, error)
+    add_event(task_id, status, result, error)
+
+
+def complete_task(task_id: str, status: str, result: str | None, error: str | None):
+    """
+    Record a task's final state and emit its "done" / "error" event, for
+    the task itself and for every task coalesced onto it.
+    """
+    answered = coalescer.release(task_id)
+    if task_id in _detached:
+        # Cancelled earlier; the run only went on for its followers.
+        _detached.discard(task_id)
+        streams.close(task_id)
+    else:
+        answered.insert(0, task_id)
+    for i, tid in enumerate(answered):
+        _finish(tid, status, result, error, completed=i == 0 and status == "done")
+
+
+def _abandon_run(run_id: str):
+    """
+    Nobody needs run_id's answer any more: drop it from the queue, or
+    cancel it if a worker is already running it.
+    """
+    # Identical tasks arriving from now on start a fresh run.
+    coalescer.release(run_id)
+    if task_queue.remove(lambda item: item[0] == run_id) is not None:
+        _detached.discard(run_id)
+        return
+    # Running: the worker reports the cancellation through complete_task().
+    _detached.add(run_id)
+    run = runs.get(run_id)
+    if run is not None:
+        run.cancel()
+
+
+async def cancel_task(task_id: str) -> Optional[TaskStatus]:
+    """
+    Cancel a queued or running task: it finishes at once with an "error"
+    event. Its agent run is taken off the queue or cancelled, unless tasks
+    coalesced onto it still wait for the answer. Returns the task's
+    status, or None if the task is unknown.
+    """
+    if broker is not None:
+        if await asyncio.to_thread(broker.cancel, task_id, CANCELLED):
+            # The completion feed delivers the event to every API process.
+            return TaskStatus(task_id=task_id, status="error", error=CANCELLED)
+        return await lookup_task(task_id)
+
+    task = tasks.get(task_id)
+    if task is None or task.status in ("done", "error"):
+        return task
+
+    traces.mark(task_id, "cancelled")
+    leader = coalescer.detach(task_id)
+    if leader is not None:
+        _finish(task_id, "error", None, CANCELLED)
+        if leader in _detached and not coalescer.followers(leader):
+            _abandon_run(leader)
+        return tasks.get(task_id)
+
+    if coalescer.followers(task_id):
+        _detached.add(task_id)
+    else:
+        _abandon_run(task_id)
+    _finish(task_id, "error", None, CANCELLED)
+    return tasks.get(task_id)
+
+
+def recover_tasks() -> int:
+    """
+    Open the journal (if configured) and re-enqueue every task that was
+    queued or running when the process last stopped.
+    """
+    if journal is None:
+        return 0
+    journal.open()
+    recovered = journal.recover()
+    for task_id, user_input, priority, client_id, session_id in recovered:
+        tasks.add(TaskStatus(task_id=task_id, status="queued"))
+        _enqueued_at[task_id] = time.monotonic()
+        traces.start(task_id).mark("recovered")
+        # Rows journaled before these columns existed, or under a priority
+        # class no longer configured, fall back to the defaults.
+        if priority not in task_queue.class_weights:
+            priority = None
+        _queue_or_coalesce(task_id, user_input, client_id or "anonymous", priority, session_id)
+    return len(recovered)
+
+
+async def broker_feed_loop(poll_interval: float = BROKER_POLL_INTERVAL, purge_interval: float = 60.0):
+    """
+    External mode: tail the broker's completion feed into this process's
+    task store and event log, so /events, long-polls and SSE work no matter
+    which API process accepted the task.
+    """
+    seq = await asyncio.to_thread(broker.last_event_seq)
+    next_purge = time.monotonic() + purge_interval
+    while True:
+        rows = await asyncio.to_thread(broker.events_since, seq)
+        for seq, ev in rows:
+            tasks.finish(ev.task_id, ev.status, ev.result, ev.error)
+            admission.release(ev.task_id, completed=ev.status == "done")
+            add_event(ev.task_id, ev.status, ev.result, ev.error)
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + purge_interval
+            await asyncio.to_thread(broker.purge, time.time() - TASK_TTL)
+        if not rows:
+            await asyncio.sleep(poll_interval)
+
+
+CallbackMetric(
+    "weatheragent_queue_depth",
+    "Tasks waiting in the queue",
+    lambda: {(c,): task_queue.class_size(c) for c in task_queue.class_weights},
+    ["priority"],
+)
+CallbackMetric(
+    "weatheragent_tasks_active",
+    "Queued + running tasks",
+    lambda: tasks.active_count,
+)
+CallbackMetric(
+    "weatheragent_events_total",
+    "Task events emitted",
+    lambda: event_log.last_event_id,
+    kind="counter",
+)
+CallbackMetric(
+    "weatheragent_tasks_coalesced_total",
+    "Tasks attached to an identical in-flight task",
+    lambda: coalescer.coalesced,
+    kind="counter",
+)
+CallbackMetric(
+    "weatheragent_tasks_rejected_total",
+    "Submissions rejected by admission control",
+    lambda: {("queue_full",): admission.rejected_depth, ("client_limit",): admission.rejected_client},
+    ["reason"],
+    kind="counter",
+)
@@ -0,0 +1,118 @@
+# backend/tracing.py
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+from .models import TaskTrace, TraceSpan
+
+# (name, start_ms, duration_ms or None for point events, attrs or None),
+# offsets relative to when the task was enqueued
+_Span = Tuple[str, float, Optional[float], Optional[Dict[str, Any]]]
+
+
+class Trace:
+    """
+    Timeline of one task, kept as a list of small tuples.
+    """
+
+    __slots__ = ("task_id", "t0", "spans")
+
+    def __init__(self, task_id: str, t0: float):
+        self.task_id = task_id
+        self.t0 = t0
+        self.spans: List[_Span] = []
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        end: float | None = None,
+        attrs: Dict[str, Any] | None = None,
+    ):
+        """
+        Record a span from `start` to `end` (time.monotonic() values), or a
+        point event if end is None.
+        """
+        self.spans.append((
+            name,
+            round((start - self.t0) * 1000, 2),
+            None if end is None else round((end - start) * 1000, 2),
+            attrs or None,
+        ))
+
+    def mark(self, name: str, attrs: Dict[str, Any] | None = None):
+        """
+        Record a point event happening now.
+        """
+        self.add(name, time.monotonic(), None, attrs)
+
+    def ordered(self) -> List[_Span]:
+        """
+        Spans by start time. They are recorded when they end, so a span
+        enclosing others comes after them in self.spans.
+        """
+        return sorted(self.spans, key=lambda span: span[1])
+
+    def to_model(self) -> TaskTrace:
+        return TaskTrace(
+            task_id=self.task_id,
+            spans=[
+                TraceSpan(name=n, start_ms=s, duration_ms=d, attrs=a)
+                for n, s, d, a in self.ordered()
+            ],
+        )
+
+    def to_jsonl(self) -> str:
+        return "".join(
+            json.dumps({"task_id": self.task_id, "name": n, "start_ms": s, "duration_ms": d, "attrs": a}) + "\n"
+            for n, s, d, a in self.ordered()
+        )
+
+
+class TraceStore:
+    """
+    Traces of the most recent `max_tasks` tasks. If `export_path` is set,
+    each trace is also appended there as JSON lines (one span per line)
+    when its task finishes.
+    """
+
+    def __init__(self, max_tasks: int, export_path: str | None = None):
+        self.max_tasks = max_tasks
+        self.export_path = export_path
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._export: Optional[IO[str]] = None
+
+    def start(self, task_id: str) -> Trace:
+        trace = Trace(task_id, time.monotonic())
+        trace.add("enqueued", trace.t0)
+        self._traces[task_id] = trace
+        while len(self._traces) > self.max_tasks:
+            self._traces.popitem(last=False)
+        return trace
+
+    def get(self, task_id: str) -> Optional[Trace]:
+        return self._traces.get(task_id)
+
+    def mark(self, task_id: str, name: str, attrs: Dict[str, Any] | None = None):
+        trace = self._traces.get(task_id)
+        if trace is not None:
+            trace.mark(name, attrs)
+
+    def finish(self, task_id: str):
+        """
+        The task emitted its final event: export the trace if configured.
+        """
+        if not self.export_path:
+            return
+        trace = self._traces.get(task_id)
+        if trace is None:
+            return
+        if self._export is None:
+            self._export = open(self.export_path, "a", encoding="utf-8", buffering=1)
+        self._export.write(trace.to_jsonl())
+
+    def close(self):
+        if self._export is not None:
+            self._export.close()
+            self._export = None
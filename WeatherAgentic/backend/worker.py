@@ -1,31 +1,534 @@
 # backend/worker.py
-from agents import Runner            # or: from openai.agents import Runner
+import argparse
+import asyncio
+import os
+import socket
+import time
+from typing import Any, Dict, List
+
+from agents import Runner, RunHooks  # or: from openai.agents import Runner
 from agent import weather_agent      # 👈 IMPORTANT: no "WeatherAgentic." prefix
+from metrics import Counter, Histogram
+from weather_api import WEATHER_CACHE_TTL, weather_cache, weather_deps
+
+from .answer_cache import AnswerCache
+from .broker import TaskBroker
+from .cache_warmer import cache_warmer
+from .fast_path import fast_path
+from .models import WorkerStats, WorkerPoolStats
+from .prefetch import prefetcher
+from .task_queue import (
+    CANCELLED,
+    TASK_DB_PATH,
+    complete_task,
+    mark_running,
+    normalize_input,
+    runs,
+    sessions,
+    streams,
+    task_queue,
+    traces,
+)
+from .sessions import Session
+from .streams import TaskStream
+from .tracing import Trace
+
+# Pool sizing. WORKER_CONCURRENCY sets a fixed pool size; WORKER_MIN /
+# WORKER_MAX enable autoscaling between the two based on queue depth.
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+WORKER_MIN = int(os.getenv("WORKER_MIN", str(WORKER_CONCURRENCY)))
+WORKER_MAX = int(os.getenv("WORKER_MAX", str(max(WORKER_MIN, WORKER_CONCURRENCY))))
+WORKER_SCALE_INTERVAL = float(os.getenv("WORKER_SCALE_INTERVAL", "1.0"))
+
+# Out-of-process workers (python -m backend.worker)
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "30"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.05"))
+WORKER_MAX_POLL_INTERVAL = float(os.getenv("WORKER_MAX_POLL_INTERVAL", "1.0"))
+
+# Final answers are reused while the weather data behind them is unchanged.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(WEATHER_CACHE_TTL)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "4096"))
+
+# Seconds an agent run may take before it is cancelled and the task fails
+# (0 = no limit), so a hung model or weather call cannot pin a worker.
+TASK_DEADLINE = float(os.getenv("TASK_DEADLINE", "300"))
+
+# Run the agent in streaming mode so GET /tasks/{task_id}/stream gets text
+# as it is generated (0: plain Runner.run, answer only at the end).
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "1") == "1"
+
+answer_cache = AnswerCache(weather_cache, ttl=ANSWER_CACHE_TTL, max_size=ANSWER_CACHE_SIZE)
+
+AGENT_RUN_SECONDS = Histogram(
+    "weatheragent_agent_run_seconds",
+    "Duration of Runner.run for one task",
+    ["outcome"],
+)
+TOOL_SECONDS = Histogram(
+    "weatheragent_tool_seconds",
+    "Duration of each tool call made by the agent",
+    ["tool"],
+)
+ANSWERS = Counter(
+    "weatheragent_answers_total",
+    "Answers produced, by where they came from",
+    ["source"],
+)
+
+
+class MetricsHooks(RunHooks):
+    """
+    Times every tool call of an agent run into TOOL_SECONDS and, given a
+    task trace, also records model calls (with token usage) and tool calls
+    as spans on it.
+    """
+
+    def __init__(self, trace: Trace | None = None):
+        self.trace = trace
+        self._started: Dict[str, float] = {}
+        self._llm_started: Dict[str, float] = {}
+
+    @staticmethod
+    def _call_key(context, tool) -> str:
+        # Parallel calls of the same tool are told apart by their call id.
+        return getattr(context, "tool_call_id", None) or tool.name
+
+    async def on_tool_start(self, context, agent, tool):
+        self._started[self._call_key(context, tool)] = time.monotonic()
+
+    async def on_tool_end(self, context, agent, tool, result):
+        started = self._started.pop(self._call_key(context, tool), None)
+        if started is not None:
+            now = time.monotonic()
+            TOOL_SECONDS.observe(now - started, tool.name)
+            if self.trace is not None:
+                self.trace.add(f"tool:{tool.name}", started, now)
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items):
+        if self.trace is not None:
+            self._llm_started[agent.name] = time.monotonic()
+
+    async def on_llm_end(self, context, agent, response):
+        started = self._llm_started.pop(agent.name, None)
+        if started is None:
+            return
+        usage = getattr(response, "usage", None)
+        self.trace.add("model_call", started, time.monotonic(), {
+            "agent": agent.name,
+            "input_tokens": getattr(usage, "input_tokens", None),
+            "output_tokens": getattr(usage, "output_tokens", None),
+        })
+
+
+async def _run_streamed(run_input: Any, hooks: RunHooks, stream: TaskStream, **kwargs) -> Any:
+    """
+    Runner.run_streamed, forwarding text deltas and tool progress to `stream`.
+    """
+    result = Runner.run_streamed(starting_agent=weather_agent, input=run_input, hooks=hooks, **kwargs)
+    try:
+        async for event in result.stream_events():
+            if event.type == "raw_response_event":
+                if getattr(event.data, "type", None) == "response.output_text.delta":
+                    stream.push("delta", event.data.delta)
+            elif event.type == "run_item_stream_event":
+                if event.name == "tool_called":
+                    raw = event.item.raw_item
+                    stream.push("tool_call", {
+                        "tool": getattr(raw, "name", None),
+                        "arguments": getattr(raw, "arguments", None),
+                    })
+                elif event.name == "tool_output":
+                    stream.push("tool_output", str(event.item.output))
+    except BaseException:
+        result.cancel()
+        raise
+    return result
 
-from .task_queue import task_queue, tasks, add_event
 
+async def run_agent(
+    user_input: str,
+    trace: Trace | None = None,
+    stream: TaskStream | None = None,
+    session_id: str | None = None,
+) -> str:
+    """
+    Run the Smart Weather Agent on one user message and return its answer,
+    or serve a cached answer to the same question built on the same
+    weather data. With a stream, the answer is also pushed to it piece by
+    piece while it is generated. With a session, the run continues that
+    conversation (and never uses the answer cache, since the answer
+    depends on earlier turns).
+    """
+    if session_id is None:
+        return await _run_turn(user_input, trace, stream, None)
+    session = sessions.get(session_id)
+    async with session.lock:
+        return await _run_turn(user_input, trace, stream, session)
+
+
+async def _run_turn(
+    user_input: str,
+    trace: Trace | None,
+    stream: TaskStream | None,
+    session: Session | None,
+) -> str:
+    use_cache = ANSWER_CACHE_ENABLED and session is None
+    key = normalize_input(user_input)
+    if use_cache:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            ANSWERS.inc("answer_cache")
+            if trace is not None:
+                trace.mark("answer_cache_hit")
+            if stream is not None:
+                stream.push("delta", cached)
+            return cached
+
+    # Follow-up turns of a session depend on their context, so only
+    # standalone tasks are routed.
+    if fast_path.enabled and session is None:
+        started = time.monotonic()
+        answer = await fast_path.answer(user_input)
+        if answer is not None:
+            ANSWERS.inc("fast_path")
+            if trace is not None:
+                trace.add("fast_path", started, time.monotonic())
+            if stream is not None:
+                stream.push("delta", answer)
+            return answer
+
+    run_input, run_kwargs = (user_input, {}) if session is None else sessions.run_args(session, user_input)
+
+    # Started before weather_deps is set, so these fetches are not
+    # counted as lookups of the run.
+    prefetched = prefetcher.start(user_input)
+    if prefetched and trace is not None:
+        trace.mark("prefetch", {"cities": [key for key, _ in prefetched]})
+
+    deps = []
+    token = weather_deps.set(deps)
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        if stream is not None:
+            agent_result = await _run_streamed(run_input, MetricsHooks(trace), stream, **run_kwargs)
+        else:
+            agent_result = await Runner.run(
+                starting_agent=weather_agent,
+                input=run_input,
+                hooks=MetricsHooks(trace),
+                **run_kwargs,
+            )
+        outcome = "done"
+    finally:
+        weather_deps.reset(token)
+        prefetcher.settle(prefetched, deps)
+        ended = time.monotonic()
+        AGENT_RUN_SECONDS.observe(ended - started, outcome)
+        if trace is not None:
+            trace.add("agent_run", started, ended, {"outcome": outcome})
+
+    ANSWERS.inc("agent")
+    answer = agent_result.final_output
 
-async def worker_loop():
+    if session is not None:
+        sessions.record(session, agent_result)
+    if use_cache:
+        answer_cache.put(key, answer, deps)
+    return answer
+
+
+class RunCancelled(Exception):
+    """
+    The agent run was cancelled from outside (DELETE /tasks/{task_id}).
+    """
+
+
+async def _await_run(run: asyncio.Task, deadline: float) -> str:
+    """
+    Wait for an agent run, giving up after `deadline` seconds (0 = never).
+    Raises asyncio.TimeoutError on deadline and RunCancelled if the run
+    was cancelled; if the caller itself is cancelled, so is the run.
+    """
+    try:
+        done, _ = await asyncio.wait({run}, timeout=deadline or None)
+    except asyncio.CancelledError:
+        run.cancel()
+        raise
+    if not done:
+        run.cancel()
+        raise asyncio.TimeoutError
+    if run.cancelled():
+        raise RunCancelled
+    return run.result()
+
+
+async def worker_loop(stats: WorkerStats | None = None):
     """
     Background worker that pulls tasks from the queue
     and runs the Smart Weather Agent.
+
+    Several of these run concurrently (see WorkerPool) and share task_queue.
     """
+    if stats is None:
+        stats = WorkerStats(worker_id=0)
+
     while True:
-        task_id, user_input = await task_queue.get()
-        task = tasks[task_id]
-        task.status = "running"
+        task_id, user_input, session_id = await task_queue.get()
+        trace = traces.get(task_id)
+        if trace is not None:
+            trace.mark("dequeued", {"worker_id": stats.worker_id})
+        mark_running(task_id)
+        stream = streams.open(task_id) if AGENT_STREAMING else None
+
+        stats.busy = True
+        stats.current_task_id = task_id
+        started = time.monotonic()
+        run = runs[task_id] = asyncio.ensure_future(run_agent(user_input, trace, stream, session_id))
 
         try:
-            agent_result = await Runner.run(
-                starting_agent=weather_agent,
-                input=user_input,
-            )
-            task.status = "done"
-            task.result = agent_result.final_output
-            add_event(task_id, "done", task.result, None)
+            complete_task(task_id, "done", await _await_run(run, TASK_DEADLINE), None)
+            stats.tasks_done += 1
+        except asyncio.TimeoutError:
+            if trace is not None:
+                trace.mark("deadline_exceeded")
+            complete_task(task_id, "error", None, f"Task exceeded its {TASK_DEADLINE:g}s deadline")
+            stats.tasks_failed += 1
+        except RunCancelled:
+            complete_task(task_id, "error", None, CANCELLED)
+            stats.tasks_failed += 1
         except Exception as e:
-            task.status = "error"
-            task.error = str(e)
-            add_event(task_id, "error", None, task.error)
+            complete_task(task_id, "error", None, str(e))
+            stats.tasks_failed += 1
+        finally:
+            runs.pop(task_id, None)
+            stats.busy = False
+            stats.current_task_id = None
+            stats.busy_seconds += time.monotonic() - started
+            task_queue.task_done()
+
+
+class WorkerPool:
+    """
+    A pool of concurrent worker_loop() coroutines sharing task_queue.
+
+    The pool starts with min_workers and, if max_workers is larger, grows
+    while tasks are waiting and every worker is busy, then shrinks back by
+    retiring idle workers once the queue drains.
+    """
+
+    def __init__(
+        self,
+        min_workers: int = WORKER_MIN,
+        max_workers: int = WORKER_MAX,
+        scale_interval: float = WORKER_SCALE_INTERVAL,
+    ):
+        if min_workers < 1:
+            raise ValueError("min_workers must be >= 1")
+        if max_workers < min_workers:
+            raise ValueError("max_workers must be >= min_workers")
+
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.scale_interval = scale_interval
+
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._stats: Dict[int, WorkerStats] = {}
+        self._next_worker_id = 1
+        self._scaler: asyncio.Task | None = None
+        # Busy time of workers that have since been retired
+        self._retired_busy_seconds = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    @property
+    def busy_count(self) -> int:
+        return sum(1 for s in self._stats.values() if s.busy)
+
+    @property
+    def busy_seconds_total(self) -> float:
+        return self._retired_busy_seconds + sum(s.busy_seconds for s in self._stats.values())
+
+    async def start(self):
+        for _ in range(self.min_workers):
+            self._spawn()
+        if self.max_workers > self.min_workers:
+            self._scaler = asyncio.create_task(self._autoscale_loop())
+
+    async def stop(self):
+        pending: List[asyncio.Task] = list(self._workers.values())
+        if self._scaler is not None:
+            pending.append(self._scaler)
+            self._scaler = None
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers.clear()
+        self._stats.clear()
+
+    def stats(self) -> WorkerPoolStats:
+        return WorkerPoolStats(
+            size=self.size,
+            min_workers=self.min_workers,
+            max_workers=self.max_workers,
+            busy=self.busy_count,
+            queue_depth=task_queue.qsize(),
+            workers=list(self._stats.values()),
+        )
+
+    def _spawn(self):
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+
+        stats = WorkerStats(worker_id=worker_id, started_at=time.time())
+        task = asyncio.create_task(worker_loop(stats))
+        self._workers[worker_id] = task
+        self._stats[worker_id] = stats
+        task.add_done_callback(lambda _t, wid=worker_id: self._forget(wid))
+
+    def _forget(self, worker_id: int):
+        self._workers.pop(worker_id, None)
+        stats = self._stats.pop(worker_id, None)
+        if stats is not None:
+            self._retired_busy_seconds += stats.busy_seconds
+
+    def _retire_idle(self) -> bool:
+        # An idle worker is parked in task_queue.get(); cancelling it there
+        # never loses an item because get() only dequeues after waking.
+        for worker_id, stats in self._stats.items():
+            if not stats.busy:
+                self._workers[worker_id].cancel()
+                self._forget(worker_id)
+                return True
+        return False
+
+    async def _autoscale_loop(self):
+        while True:
+            await asyncio.sleep(self.scale_interval)
+
+            depth = task_queue.qsize()
+            idle = sum(1 for s in self._stats.values() if not s.busy)
+
+            if depth > idle and self.size < self.max_workers:
+                for _ in range(min(depth - idle, self.max_workers - self.size)):
+                    self._spawn()
+            elif depth == 0 and idle > 1 and self.size > self.min_workers:
+                self._retire_idle()
+
+
+# ============================
+#   OUT-OF-PROCESS WORKERS
+# ============================
+
+async def _heartbeat_loop(broker: TaskBroker, owner: str, lease_seconds: float, slot_runs: Dict[str, asyncio.Task]):
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        for task_id in await asyncio.to_thread(broker.heartbeat, owner, lease_seconds):
+            run = slot_runs.get(task_id)
+            if run is not None:
+                run.cancel()
+
+
+async def leased_worker_loop(
+    broker: TaskBroker,
+    slot: int,
+    lease_seconds: float = WORKER_LEASE_SECONDS,
+    poll_interval: float = WORKER_POLL_INTERVAL,
+    max_poll_interval: float = WORKER_MAX_POLL_INTERVAL,
+):
+    """
+    Claim tasks from the shared broker and run the agent on them.
+
+    Each claim is a lease renewed by a heartbeat; if this process dies, the
+    lease expires and another worker picks the task up. The heartbeat also
+    reports tasks cancelled through the API, whose runs are then stopped.
+    When the queue is empty the poll interval backs off up to
+    max_poll_interval.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{slot}"
+    await asyncio.to_thread(broker.register_worker, owner, slot)
+    slot_runs: Dict[str, asyncio.Task] = {}
+    heartbeat = asyncio.create_task(_heartbeat_loop(broker, owner, lease_seconds, slot_runs))
+
+    idle_sleep = poll_interval
+    try:
+        while True:
+            claimed = await asyncio.to_thread(broker.claim, owner, lease_seconds)
+            if claimed is None:
+                await asyncio.sleep(idle_sleep)
+                idle_sleep = min(idle_sleep * 2, max_poll_interval)
+                continue
+            idle_sleep = poll_interval
+
+            task_id, user_input = claimed
+            started = time.monotonic()
+            run = slot_runs[task_id] = asyncio.ensure_future(run_agent(user_input))
+            try:
+                status, result, error = "done", await _await_run(run, TASK_DEADLINE), None
+            except asyncio.TimeoutError:
+                status, result, error = "error", None, f"Task exceeded its {TASK_DEADLINE:g}s deadline"
+            except RunCancelled:
+                # Already recorded by the broker; complete() below is a no-op.
+                status, result, error = "error", None, CANCELLED
+            except Exception as e:
+                status, result, error = "error", None, str(e)
+            finally:
+                slot_runs.pop(task_id, None)
+
+            await asyncio.to_thread(
+                broker.complete,
+                owner,
+                task_id,
+                status,
+                result,
+                error,
+                time.monotonic() - started,
+            )
+    finally:
+        heartbeat.cancel()
+        await asyncio.to_thread(broker.unregister_worker, owner)
+
+
+async def run_external_workers(db_path: str, concurrency: int, lease_seconds: float):
+    broker = TaskBroker(db_path)
+    # Each worker process has its own weather cache to keep warm.
+    warmer = asyncio.create_task(cache_warmer.run())
+    try:
+        await asyncio.gather(*(
+            leased_worker_loop(broker, slot, lease_seconds)
+            for slot in range(1, concurrency + 1)
+        ))
+    finally:
+        warmer.cancel()
+        broker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run weather agent workers that claim tasks from the shared SQLite broker "
+                    "(start the API with WORKER_MODE=external and the same TASK_DB_PATH).",
+    )
+    parser.add_argument("--db", default=TASK_DB_PATH, help="Broker SQLite file (default: $TASK_DB_PATH)")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="Concurrent agent runs in this process")
+    parser.add_argument("--lease", type=float, default=WORKER_LEASE_SECONDS,
+                        help="Lease length in seconds; renewed every lease/3")
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error("--db or TASK_DB_PATH is required")
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY not set")
+
+    print(f"Worker {os.getpid()}: {args.concurrency} slot(s) on {args.db}")
+    try:
+        asyncio.run(run_external_workers(args.db, args.concurrency, args.lease))
+    except KeyboardInterrupt:
+        pass
+
 
-        task_queue.task_done()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# bench/bench_gazetteer.py
+"""
+City resolver latency and accuracy over a large generated list of city
+spellings: names in different cases, aliases ("SLC"), names with a
+state/country ("Salt Lake City, UT"), prefixes ("Salt Lake") and typos
+("Salt Lkae City"), all derived from the bundled gazetteer, plus real
+cities the gazetteer does not have ("York", "Kiel") and known names with
+a region the gazetteer does not know ("Manchester, NH") or with the wrong
+one ("Perth, Scotland"), which must not resolve to a place that merely
+looks alike.
+
+    cd WeatherAgentic
+    python -m bench.bench_gazetteer --size 200000
+"""
+import argparse
+import random
+import string
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from gazetteer import GAZETTEER_PATH, MIN_FUZZY_CHARS, MIN_PREFIX_CHARS, REGION_ALIASES, Gazetteer, normalize
+from weather_api import normalize_city
+
+# Real cities missing from data/cities.tsv, many one edit away from one in it.
+UNKNOWN_CITIES = (
+    "York", "Nome", "Aden", "Kiel", "Kobe", "Leon", "Gent", "Bari", "Cali", "Sant",
+    "Malmo", "Turku", "Graz", "Linz", "Basel", "Lille", "Nantes", "Bremen", "Leipzig",
+    "Dresden", "Hanover", "Utrecht", "Leiden", "Tampere", "Aarhus", "Odense", "Gdansk",
+    "Poznan", "Wroclaw", "Sapporo", "Sendai", "Nagoya", "Incheon", "Harbin", "Kunming",
+    "Nagpur", "Indore", "Multan", "Tabriz", "Shiraz", "Aleppo", "Izmir", "Tripoli",
+    "Ibadan", "Mombasa", "Durban", "Rosario", "Cordoba", "Mendoza", "Arequipa", "Cuenca",
+    "Recife", "Salvador", "Manaus", "Tijuana", "Puebla", "Laredo", "Tyler", "Salem",
+    "Casper", "Duluth", "Peoria", "Dayton", "Akron", "Toledo", "Scranton", "Albany",
+    "Trenton", "Mobile", "Lubbock", "Topeka", "Lincoln", "Bozeman", "Regina", "Hamilton",
+    "Windsor", "Sudbury", "Hobart", "Darwin", "Dunedin", "Nelson",
+)
+
+# Real states / countries missing from data/cities.tsv.
+UNKNOWN_REGIONS = (
+    "NH", "New Hampshire", "WV", "West Virginia", "Tasmania", "TAS", "Bavaria",
+    "Saskatchewan", "SK", "Yukon", "Slovakia", "Latvia", "Iran", "Tunisia", "Bolivia",
+)
+
+# Negative kinds: spellings expected not to resolve.
+NEGATIVE_KINDS = ("unknown", "unk-region", "bad-region")
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word) - 1)
+    kind = rng.choice(("delete", "swap", "replace", "insert"))
+    if kind == "delete":
+        return word[:i] + word[i + 1:]
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    letter = rng.choice(string.ascii_lowercase)
+    if kind == "replace":
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+
+def spellings(gazetteer: Gazetteer, rng: random.Random) -> List[Tuple[str, str, str]]:
+    """
+    (kind, spelling, expected place id) for every place. The expected
+    place is the first row with that name (and that region, if given);
+    None for a prefix means any place starting that way. Spellings of
+    NEGATIVE_KINDS are expected not to resolve.
+    """
+    first: Dict[str, str] = {}
+    for place, keys in zip(gazetteer.places, gazetteer.place_names()):
+        for key in keys:
+            first.setdefault(key, place.id)
+        for region in (place.admin, place.country):
+            if region:
+                first.setdefault(normalize(f"{place.name}, {region}"), place.id)
+
+    unknown_regions = [
+        r for r in UNKNOWN_REGIONS
+        if normalize(r) not in gazetteer.region_words and normalize(r) not in REGION_ALIASES
+    ]
+    known_regions = sorted({r for p in gazetteer.places for r in (p.admin, p.country) if r})
+
+    out = []
+    for place, keys in zip(gazetteer.places, gazetteer.place_names()):
+        name = place.name
+        default = first[normalize(name)]
+        out += [("name", name, default), ("name", name.lower(), default), ("name", name.upper(), default)]
+        out += [("alias", alias, first[alias]) for alias in keys if alias != normalize(name)]
+        for region in (place.admin, place.country):
+            if region:
+                expected = first[normalize(f"{name}, {region}")]
+                out.append(("region", f"{name}, {region}", expected))
+                out.append(("region", f"{name.lower()} {region.lower()}", expected))
+
+        # A region the file lacks, or a known one this name is not in.
+        region = rng.choice(unknown_regions)
+        out.append(("unk-region", f"{name}, {region}", None))
+        out.append(("unk-region", f"{name.lower()} {region.lower()}", None))
+        region = rng.choice(known_regions)
+        if normalize(f"{name}, {region}") not in first:
+            out.append(("bad-region", f"{name}, {region}", None))
+            out.append(("bad-region", f"{name.lower()} {region.lower()}", None))
+
+        words = name.split()
+        if len(words) > 1 and len(" ".join(words[:-1])) >= MIN_PREFIX_CHARS:
+            out.append(("prefix", " ".join(words[:-1]), None))
+        if len(name) - 2 >= MIN_PREFIX_CHARS:
+            out.append(("prefix", name[:len(name) - 2], None))
+        if len(name) >= MIN_FUZZY_CHARS:
+            for _ in range(3):
+                out.append(("typo", _typo(rng, name), default))
+
+    known = {key for keys in gazetteer.place_names() for key in keys}
+    for city in UNKNOWN_CITIES:
+        if normalize(city) not in known:
+            out += [("unknown", city, None), ("unknown", city.lower(), None)]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="Lookups to run")
+    parser.add_argument("--path", default=GAZETTEER_PATH, help="Gazetteer TSV")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    gazetteer = Gazetteer.load(args.path)
+    load_ms = (time.perf_counter() - started) * 1000
+    stats = gazetteer.stats()
+    print(f"loaded {stats['places']} places, {stats['names']} names, "
+          f"{stats['fuzzy_variants']} fuzzy variants in {load_ms:.1f} ms")
+
+    base = spellings(gazetteer, rng)
+    workload = [base[i % len(base)] for i in range(args.size)]
+    rng.shuffle(workload)
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    resolved: Dict[str, int] = defaultdict(int)
+    correct: Dict[str, int] = defaultdict(int)
+    keys_before, keys_after = set(), set()
+    clock = time.perf_counter_ns
+    for kind, text, expected in workload:
+        t0 = clock()
+        place = gazetteer.resolve(text)
+        timings[kind].append((clock() - t0) / 1000)
+        keys_before.add(normalize_city(text))
+        keys_after.add(place.id if place else normalize_city(text))
+        if place is None:
+            if kind in NEGATIVE_KINDS:
+                correct[kind] += 1
+            continue
+        resolved[kind] += 1
+        # Prefixes may fairly complete to any place starting that way.
+        if kind not in NEGATIVE_KINDS and (expected is None or place.id == expected):
+            correct[kind] += 1
+
+    def pct(values: List[float], q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    print(f"\n{'kind':<10} {'lookups':>8} {'resolved':>9} {'correct':>8} {'p50 us':>8} {'p99 us':>8} {'mean us':>8}")
+    everything: List[float] = []
+    for kind in ("name", "alias", "region", "prefix", "typo", *NEGATIVE_KINDS):
+        values = sorted(timings[kind])
+        if not values:
+            continue
+        everything += values
+        n = len(values)
+        print(f"{kind:<10} {n:>8} {resolved[kind] / n:>9.1%} {correct[kind] / n:>8.1%} "
+              f"{pct(values, 0.5):>8.1f} {pct(values, 0.99):>8.1f} {sum(values) / n:>8.1f}")
+    everything.sort()
+    n = len(everything)
+    print(f"{'all':<10} {n:>8} {sum(resolved.values()) / n:>9.1%} {sum(correct.values()) / n:>8.1%} "
+          f"{pct(everything, 0.5):>8.1f} {pct(everything, 0.99):>8.1f} {sum(everything) / n:>8.1f}")
+    negatives = sum(len(timings[kind]) for kind in NEGATIVE_KINDS)
+    if negatives:
+        false_positives = sum(resolved[kind] for kind in NEGATIVE_KINDS)
+        print(f"\nfalse positives (unknown city or region resolved to a place): {false_positives / negatives:.1%}")
+    print(f"\ndistinct weather cache keys: {len(keys_before)} as typed -> {len(keys_after)} resolved")
+
+
+if __name__ == "__main__":
+    main()
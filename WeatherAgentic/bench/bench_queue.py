@@ -0,0 +1,125 @@
+# bench/bench_queue.py
+"""
+Enqueue/dequeue throughput of the fair scheduler the workers read from,
+in memory vs. backed by the SQLite journal, with a mix of interactive and
+batch tasks from many clients.
+
+    cd WeatherAgentic
+    python -m bench.bench_queue --tasks 20000 --clients 50 --interactive 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+from backend.durable import SqliteTaskJournal
+from backend.models import TaskStatus
+from backend.scheduler import FairScheduler
+from backend.task_queue import SCHED_WEIGHT_BATCH, SCHED_WEIGHT_INTERACTIVE, TaskStore
+
+
+def workload(n_tasks: int, n_clients: int, interactive: float, seed: int = 1) -> List[Tuple[str, str, str]]:
+    """
+    (task_id, client_id, priority) in submission order.
+    """
+    rng = random.Random(seed)
+    return [
+        (
+            str(uuid.uuid4()),
+            f"client-{rng.randrange(n_clients)}",
+            "interactive" if rng.random() < interactive else "batch",
+        )
+        for _ in range(n_tasks)
+    ]
+
+
+async def run_once(
+    tasks: List[Tuple[str, str, str]],
+    journal: SqliteTaskJournal | None,
+) -> Tuple[float, Dict[str, float]]:
+    """
+    Seconds to push and pop every task, and the mean dequeue position
+    (0 = first, 1 = last) per priority class.
+    """
+    queue = FairScheduler(
+        class_weights={"interactive": SCHED_WEIGHT_INTERACTIVE, "batch": SCHED_WEIGHT_BATCH},
+    )
+    store = TaskStore()
+    flusher = asyncio.create_task(journal.flush_loop()) if journal else None
+    positions: Dict[str, List[int]] = {"interactive": [], "batch": []}
+
+    started = time.perf_counter()
+
+    # Same transitions the API and the workers go through per task.
+    for task_id, client_id, priority in tasks:
+        store.add(TaskStatus(task_id=task_id, status="queued"))
+        if journal:
+            journal.record_enqueued(task_id, "Weather in SLC?", priority, client_id)
+        queue.put_nowait((task_id, priority), client_id=client_id, priority=priority)
+
+    while not queue.empty():
+        task_id, priority = queue.get_nowait()
+        positions[priority].append(len(tasks) - queue.qsize() - 1)
+        queue.task_done()
+        store[task_id].status = "running"
+        if journal:
+            journal.record_running(task_id)
+        store.finish(task_id, "done", "Clear, 12°C", None)
+        if journal:
+            journal.record_finished(task_id, "done", "Clear, 12°C", None)
+        if queue.qsize() % 1000 == 0:
+            await asyncio.sleep(0)   # let the background flusher run
+
+    if journal:
+        journal.flush()
+    elapsed = time.perf_counter() - started
+
+    if flusher:
+        flusher.cancel()
+    order = {
+        priority: sum(p) / len(p) / max(1, len(tasks) - 1)
+        for priority, p in positions.items() if p
+    }
+    return elapsed, order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--interactive", type=float, default=0.2, help="Share of interactive tasks")
+    args = parser.parse_args()
+
+    configs = [
+        ("in-memory", None),
+        ("sqlite, batched (50ms / 256 ops)", dict(flush_interval=0.05, batch_size=256)),
+        ("sqlite, commit per write", dict(flush_interval=0, batch_size=1)),
+    ]
+
+    print(f"{args.tasks} tasks from {args.clients} clients, {args.interactive:.0%} interactive")
+    print(f"\n{'backend':<36} {'tasks/s':>10} {'us/task':>9} {'commits':>8} {'int. pos':>9} {'batch pos':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, opts) in enumerate(configs):
+            journal = None
+            n = args.tasks
+            if opts is not None:
+                journal = SqliteTaskJournal(os.path.join(tmp, f"bench{i}.db"), **opts)
+                journal.open()
+                if opts["flush_interval"] == 0:
+                    n = min(n, 2000)   # one fsync per write: keep the run short
+
+            elapsed, order = asyncio.run(run_once(workload(n, args.clients, args.interactive), journal))
+            commits = journal.commits if journal else 0
+            if journal:
+                journal.close()
+            print(f"{name:<36} {n / elapsed:>10.0f} {elapsed / n * 1e6:>9.1f} {commits:>8} "
+                  f"{order.get('interactive', 0):>9.2f} {order.get('batch', 0):>9.2f}")
+    print("\n(int. / batch pos: mean dequeue position of that class, 0 = first out, 1 = last)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# bench/load_test.py
+"""
+End-to-end load test of the backend with the model and wttr.in replaced by
+local stubs (see bench/stubs.py), so it costs no API credits.
+
+Starts `backend.api:app` in a subprocess, drives it with N concurrent
+clients that each submit a task (POST /tasks) and then wait for its
+result, and reports throughput, end-to-end latency percentiles and the
+backend's memory growth.
+
+    cd WeatherAgentic
+    python -m bench.load_test --clients 50 --duration 30
+    python -m bench.load_test --clients 200 --retrieve sse --unique \\
+        --model-latency lognormal:0.8,0.6 --env WORKER_CONCURRENCY=32
+
+Backend settings (WORKER_*, caches, ...) are passed with --env KEY=VALUE;
+--json prints the report as one JSON object, for comparing runs.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from bench.stubs import StubModel, parse_latency, serve_stub_wttr
+
+CITIES = [
+    "Salt Lake City", "Denver", "Boise", "Seattle", "Portland", "Chicago", "Boston", "Austin",
+    "Phoenix", "Miami", "Atlanta", "Dallas", "Houston", "Detroit", "Minneapolis", "Nashville",
+    "London", "Paris", "Berlin", "Madrid", "Rome", "Vienna", "Prague", "Oslo", "Stockholm",
+    "Helsinki", "Dublin", "Lisbon", "Warsaw", "Athens", "Istanbul", "Cairo", "Nairobi", "Lagos",
+    "Mumbai", "Delhi", "Bangkok", "Singapore", "Tokyo", "Osaka", "Seoul", "Beijing", "Shanghai",
+    "Sydney", "Melbourne", "Auckland", "Toronto", "Vancouver", "Montreal", "Mexico City",
+]
+TEMPLATES = [
+    "Weather in {city}?",
+    "What's the weather like in {city} today?",
+    "What should I wear in {city} tonight?",
+    "Do I need a jacket in {city}?",
+]
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def rss_bytes(pid: int) -> int | None:
+    """
+    Resident set size of a process (Linux /proc; None elsewhere).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# ============================
+#   BACKEND UNDER TEST
+# ============================
+
+def serve_backend(port: int, model_latency: str):
+    """
+    Child process: the real backend, with weather_agent's model stubbed.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    import uvicorn
+    from agents import set_tracing_disabled
+    from agent import weather_agent
+
+    set_tracing_disabled(True)
+    weather_agent.model = StubModel(parse_latency(model_latency))
+    uvicorn.run("backend.api:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_backend(args, wttr_url: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(kv.split("=", 1) for kv in args.env)
+    env["WTTR_BASE_URL"] = wttr_url
+    return subprocess.Popen(
+        [sys.executable, "-m", "bench.load_test", "--serve-backend",
+         "--port", str(args.port), "--model-latency", args.model_latency],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {proc.returncode}")
+        try:
+            if (await client.get("/stats")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Backend did not become ready")
+
+
+# ============================
+#   LOAD GENERATOR
+# ============================
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.submitted = 0
+        self.done = 0
+        self.errors = 0
+        self.rejected = 0
+        self.seq = itertools.count()
+
+
+class SSEResults:
+    """
+    One /events/stream subscription shared by all clients; hands each
+    task's final event to whoever waits for it.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._early: Dict[str, str] = {}
+        self._ready = asyncio.Event()
+
+    async def run(self):
+        async with self.client.stream("GET", "/events/stream", timeout=None) as resp:
+            self._ready.set()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                ev = json.loads(line[len("data: "):])
+                if ev["status"] not in ("done", "error"):
+                    continue
+                fut = self._waiters.pop(ev["task_id"], None)
+                if fut is None:
+                    self._early[ev["task_id"]] = ev["status"]
+                elif not fut.done():
+                    fut.set_result(ev["status"])
+
+    async def wait(self, task_id: str) -> str:
+        status = self._early.pop(task_id, None)
+        if status is not None:
+            return status
+        fut = self._waiters[task_id] = asyncio.get_running_loop().create_future()
+        return await fut
+
+
+async def wait_result(client: httpx.AsyncClient, task_id: str) -> str:
+    while True:
+        resp = await client.get(f"/tasks/{task_id}/wait", params={"timeout": 30})
+        resp.raise_for_status()
+        status = resp.json()["status"]
+        if status in ("done", "error"):
+            return status
+
+
+async def run_client(n: int, client: httpx.AsyncClient, args, deadline: float,
+                     results: Results, sse: SSEResults | None):
+    headers = {"X-Client-Id": f"load-{n}"}
+    cities = CITIES[:args.cities]
+    while time.monotonic() < deadline:
+        text = random.choice(TEMPLATES).format(city=random.choice(cities))
+        if args.unique:
+            text += f" (#{next(results.seq)})"
+
+        started = time.perf_counter()
+        resp = await client.post("/tasks", json={"input": text}, headers=headers)
+        if resp.status_code == 429:
+            results.rejected += 1
+            retry_after = float(resp.headers.get("Retry-After", "1"))
+            await asyncio.sleep(min(retry_after, max(0.0, deadline - time.monotonic())))
+            continue
+        resp.raise_for_status()
+        results.submitted += 1
+        task_id = resp.json()["task_id"]
+
+        status = await (sse.wait(task_id) if sse else wait_result(client, task_id))
+        results.latencies.append(time.perf_counter() - started)
+        if status == "done":
+            results.done += 1
+        else:
+            results.errors += 1
+
+        if args.think_time:
+            await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+
+async def run_load(args) -> Dict[str, Any]:
+    wttr, wttr_url = serve_stub_wttr(parse_latency(args.wttr_latency))
+    proc = start_backend(args, wttr_url)
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.clients + 10, max_keepalive_connections=args.clients + 10)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await wait_ready(client, proc)
+            rss_start = rss_bytes(proc.pid)
+            rss_peak = rss_start or 0
+
+            sse = sse_task = None
+            if args.retrieve == "sse":
+                sse = SSEResults(client)
+                sse_task = asyncio.create_task(sse.run())
+                await sse._ready.wait()
+
+            results = Results()
+            started = time.monotonic()
+            deadline = started + args.duration
+            clients = [
+                asyncio.create_task(run_client(i, client, args, deadline, results, sse))
+                for i in range(args.clients)
+            ]
+            while not all(c.done() for c in clients):
+                await asyncio.sleep(0.5)
+                rss_peak = max(rss_peak, rss_bytes(proc.pid) or 0)
+            await asyncio.gather(*clients)
+            elapsed = time.monotonic() - started
+            rss_end = rss_bytes(proc.pid)
+            if sse_task is not None:
+                sse_task.cancel()
+
+            stats = (await client.get("/stats")).json()
+    finally:
+        proc.terminate()
+        proc.wait()
+        wttr.shutdown()
+
+    lat = sorted(results.latencies)
+    completed = results.done + results.errors
+    report: Dict[str, Any] = {
+        "clients": args.clients,
+        "duration_s": round(elapsed, 2),
+        "submitted": results.submitted,
+        "done": results.done,
+        "errors": results.errors,
+        "rejected_429": results.rejected,
+        "throughput_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(percentile(lat, 0.50), 4),
+            "p95": round(percentile(lat, 0.95), 4),
+            "p99": round(percentile(lat, 0.99), 4),
+            "max": round(lat[-1], 4) if lat else 0.0,
+        },
+        "wttr_requests": wttr.hits,
+        "answer_cache_hits": stats.get("answer_cache", {}).get("hits"),
+        "coalesced": stats.get("coalescing", {}).get("coalesced"),
+    }
+    if rss_start is not None and rss_end is not None:
+        report["rss_mib"] = {
+            "start": round(rss_start / 2**20, 1),
+            "peak": round(rss_peak / 2**20, 1),
+            "end": round(rss_end / 2**20, 1),
+            "growth": round((rss_end - rss_start) / 2**20, 1),
+            "growth_per_1k_tasks_kib": round((rss_end - rss_start) / 1024 / max(1, completed) * 1000, 1),
+        }
+    return report
+
+
+def print_report(r: Dict[str, Any]):
+    lat = r["latency_s"]
+    print(f"clients            {r['clients']}")
+    print(f"duration           {r['duration_s']} s")
+    print(f"tasks              {r['submitted']} submitted, {r['done']} done, {r['errors']} error, "
+          f"{r['rejected_429']} rejected (429)")
+    print(f"throughput         {r['throughput_per_s']} tasks/s")
+    print(f"latency (e2e)      p50 {lat['p50'] * 1000:.0f} ms   p95 {lat['p95'] * 1000:.0f} ms   "
+          f"p99 {lat['p99'] * 1000:.0f} ms   max {lat['max'] * 1000:.0f} ms")
+    print(f"wttr requests      {r['wttr_requests']}   answer-cache hits {r['answer_cache_hits']}   "
+          f"coalesced {r['coalesced']}")
+    rss = r.get("rss_mib")
+    if rss:
+        print(f"backend RSS        {rss['start']} -> {rss['end']} MiB (peak {rss['peak']}, "
+              f"+{rss['growth_per_1k_tasks_kib']} KiB per 1k tasks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to keep submitting")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="Mean seconds a client pauses between tasks (exponential)")
+    parser.add_argument("--retrieve", choices=["wait", "sse"], default="wait",
+                        help="wait: long-poll GET /tasks/{id}/wait; sse: one shared /events/stream")
+    parser.add_argument("--cities", type=int, default=len(CITIES), help="Size of the city pool (1-50)")
+    parser.add_argument("--unique", action="store_true",
+                        help="Make every input distinct, defeating coalescing and the answer cache")
+    parser.add_argument("--model-latency", default="lognormal:0.4,0.5",
+                        help="Per model call: const:S, uniform:A,B, exp:MEAN or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--wttr-latency", default="lognormal:0.15,0.6", help="Per wttr.in request, same format")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment for the backend process (repeatable)")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--serve-backend", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    parse_latency(args.model_latency)
+    parse_latency(args.wttr_latency)
+    if args.serve_backend:
+        serve_backend(args.port, args.model_latency)
+        return
+    if any("=" not in kv for kv in args.env):
+        parser.error("--env expects KEY=VALUE")
+    args.cities = max(1, min(args.cities, len(CITIES)))
+
+    report = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# bench/stubs.py
+"""
+Local stand-ins for the two remote dependencies of an agent run, so the
+backend can be load-tested without API credits or network access:
+
+- StubModel replaces the OpenAI model behind weather_agent. It plays the
+  same script a real model does (call get_weather, optionally
+  recommend_clothing, then answer), so the real Runner loop, tools, hooks
+  and streaming all run.
+- serve_stub_wttr() serves a canned wttr.in j1 payload.
+
+Both sleep for a latency drawn from a configurable distribution.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AsyncIterator, Callable, List, Tuple
+
+from agents import Model, ModelResponse, Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Seconds-sampler for a distribution spec:
+
+        const:0.2            always 0.2 s
+        uniform:0.1,0.5      uniform between 0.1 and 0.5 s
+        exp:0.3              exponential with mean 0.3 s
+        lognormal:0.4,0.5    lognormal with median 0.4 s and sigma 0.5
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        params = [float(a) for a in args.split(",")] if args else []
+        if kind == "const" and len(params) == 1:
+            return lambda: params[0]
+        if kind == "uniform" and len(params) == 2:
+            return lambda: random.uniform(params[0], params[1])
+        if kind == "exp" and len(params) == 1:
+            return lambda: random.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+        if kind == "lognormal" and len(params) == 2:
+            mu = math.log(params[0])
+            return lambda: random.lognormvariate(mu, params[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r} (e.g. const:0.2, uniform:0.1,0.5, exp:0.3, lognormal:0.4,0.5)")
+
+
+# ============================
+#   STUB MODEL
+# ============================
+
+_CITY = re.compile(r"\b(?:in|for|at)\s+([A-Za-z][A-Za-z .'-]*?)(?:[?!.,]|\s+(?:today|tonight|tomorrow|now|for|and|or|vs|this)\b|$)", re.I)
+
+_CITY_LIST = re.compile(r"\b(?:in|for|at)\s+(.+?)(?:[?!.]|\s+(?:today|tonight|tomorrow|now|this)\b|$)", re.I)
+_LIST_SEP = re.compile(r",\s*(?:and\s+)?|\s+(?:and|or|vs\.?)\s+", re.I)
+
+
+def _user_text(input) -> str:
+    if isinstance(input, str):
+        return input
+    for item in input:
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _tool_outputs(input) -> List[str]:
+    if isinstance(input, str):
+        return []
+    return [
+        str(item.get("output", ""))
+        for item in input
+        if isinstance(item, dict) and item.get("type") == "function_call_output"
+    ]
+
+
+class StubModel(Model):
+    """
+    Scripted model: weather questions take two model calls (get_weather,
+    get_weather_many for a list of cities or get_forecast for
+    tonight/tomorrow, then the answer), "wear" questions three
+    (get_weather, recommend_clothing, answer).
+    """
+
+    def __init__(self, latency: Callable[[], float], chunk_chars: int = 12):
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+
+    def _next_output(self, input) -> Tuple[list, str]:
+        text = _user_text(input)
+        outputs = _tool_outputs(input)
+        m = _CITY.search(text)
+        city = m.group(1).strip() if m else "London"
+        wants_clothing = bool(re.search(r"\b(wear|jacket|coat|umbrella)\b", text, re.I))
+
+        m = _CITY_LIST.search(text)
+        cities: List[str] = []
+        for part in (_LIST_SEP.split(m.group(1)) if m else []):
+            if len(part.strip()) == 2 and cities:
+                cities[-1] += f", {part.strip()}"   # "Salt Lake City, UT"
+            else:
+                cities.append(part.strip())
+
+        later = re.search(r"\b(tonight|tomorrow|later|forecast)\b", text, re.I)
+
+        call = None
+        if not outputs and len(cities) > 1:
+            call = ("get_weather_many", {"cities": cities})
+        elif not outputs and later:
+            when = later.group(1).lower()
+            args = {"city": city, "day": 1 if when == "tomorrow" else 0}
+            if when == "tonight":
+                args["hour"] = 21
+            call = ("get_forecast", args)
+        elif not outputs:
+            call = ("get_weather", {"city": city})
+        elif wants_clothing and len(outputs) == 1:
+            call = ("recommend_clothing", {"temp_c": 12, "condition": "Clear"})
+        if call is not None:
+            name, args = call
+            item = ResponseFunctionToolCall(
+                id=f"fc_{uuid.uuid4().hex}",
+                call_id=f"call_{uuid.uuid4().hex}",
+                name=name,
+                arguments=json.dumps(args),
+                type="function_call",
+                status="completed",
+            )
+            return [item], ""
+
+        answer = " ".join(" ".join(o.split()) for o in outputs) or f"No data for {city}."
+        message = ResponseOutputMessage(
+            id=f"msg_{uuid.uuid4().hex}",
+            role="assistant",
+            status="completed",
+            type="message",
+            content=[ResponseOutputText(text=answer, type="output_text", annotations=[])],
+        )
+        return [message], answer
+
+    @staticmethod
+    def _usage(input, answer: str) -> Tuple[int, int]:
+        # ~4 characters per token
+        return len(json.dumps(input, default=str)) // 4, max(1, len(answer) // 4)
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                           prompt=None, **kwargs) -> ModelResponse:
+        await asyncio.sleep(self.latency())
+        output, answer = self._next_output(input)
+        in_tok, out_tok = self._usage(input, answer)
+        return ModelResponse(
+            output=output,
+            usage=Usage(requests=1, input_tokens=in_tok, output_tokens=out_tok, total_tokens=in_tok + out_tok),
+            response_id=None,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                              prompt=None, **kwargs) -> AsyncIterator:
+        delay = self.latency()
+        output, answer = self._next_output(input)
+        seq = 0
+        if answer:
+            # Time to first token is ~1/3 of the call; the rest is spread over the deltas.
+            chunks = [answer[i:i + self.chunk_chars] for i in range(0, len(answer), self.chunk_chars)]
+            await asyncio.sleep(delay / 3)
+            for chunk in chunks:
+                await asyncio.sleep(delay * 2 / 3 / len(chunks))
+                yield ResponseTextDeltaEvent.model_construct(
+                    type="response.output_text.delta",
+                    item_id=output[0].id,
+                    output_index=0,
+                    content_index=0,
+                    delta=chunk,
+                    logprobs=[],
+                    sequence_number=seq,
+                )
+                seq += 1
+        else:
+            await asyncio.sleep(delay)
+
+        in_tok, out_tok = self._usage(input, answer)
+        response = Response.model_construct(
+            id=f"resp_{uuid.uuid4().hex}",
+            object="response",
+            created_at=time.time(),
+            model="stub",
+            output=output,
+            # model_construct: the required detail fields vary across openai versions
+            usage=ResponseUsage.model_construct(
+                input_tokens=in_tok,
+                output_tokens=out_tok,
+                total_tokens=in_tok + out_tok,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+            ),
+        )
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed", response=response, sequence_number=seq
+        )
+
+
+# ============================
+#   STUB WTTR.IN
+# ============================
+
+def _j1_payload() -> bytes:
+    hourly = [
+        {
+            "time": str(h * 300),
+            "tempC": str(8 + h),
+            "tempF": str(46 + 2 * h),
+            "weatherDesc": [{"value": "Light rain" if h >= 6 else "Sunny"}],
+            "chanceofrain": "70" if h >= 6 else "5",
+        }
+        for h in range(8)
+    ]
+    return json.dumps({
+        "current_condition": [{
+            "temp_C": "12", "temp_F": "54", "FeelsLikeC": "10", "FeelsLikeF": "50",
+            "humidity": "61", "weatherDesc": [{"value": "Clear"}],
+        }],
+        "weather": [
+            {
+                "date": f"2025-01-0{d + 1}",
+                "maxtempC": "15", "mintempC": "8", "maxtempF": "60", "mintempF": "46",
+                "hourly": hourly,
+            }
+            for d in range(3)
+        ],
+    }).encode()
+
+
+def serve_stub_wttr(latency: Callable[[], float], port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start a threaded wttr.in stand-in; returns (server, base URL). Every
+    request is answered after latency() seconds.
+    """
+    payload = _j1_payload()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency())
+            server.hits += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.hits = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -1,60 +1,122 @@
 # chat_loop.py
+import argparse
+import json
 import time
+import uuid
+from typing import Optional
+
 import requests
 
 BACKEND_URL = "http://127.0.0.1:8000"
 
+# Server holds each long-poll request open for up to this many seconds.
+WAIT_TIMEOUT = 30
 
-def chat():
-    print("🌤  Weather Agent (Background Task Queue). Type 'exit' to quit.\n")
+# Identifies this CLI for the backend's per-client limits.
+CLIENT_ID = f"chat-{uuid.uuid4().hex[:8]}"
 
-    while True:
-        user = input("You: ").strip()
-        if user.lower() in ("exit", "quit"):
-            break
+# With --session, one conversation per run, so follow-up questions see
+# earlier turns. Off by default: session turns skip the backend's fast
+# path, answer cache and coalescing.
+SESSION_ID: Optional[str] = None
 
-        # 1) Create task
+
+def submit_task(user_input: str) -> str:
+    """
+    POST /tasks, waiting and retrying while the backend answers 429.
+    """
+    while True:
         resp = requests.post(
             f"{BACKEND_URL}/tasks",
-            json={"input": user},
+            json={"input": user_input, **({"session_id": SESSION_ID} if SESSION_ID else {})},
+            headers={"X-Client-Id": CLIENT_ID},
             timeout=10,
         )
+        if resp.status_code == 429:
+            retry_after = int(resp.headers.get("Retry-After", "1"))
+            print(f"(backend busy, retrying in {retry_after}s)")
+            time.sleep(retry_after)
+            continue
         resp.raise_for_status()
-        task_id = resp.json()["task_id"]
-        print(f"(submitted task_id={task_id})")
+        return resp.json()["task_id"]
+
+
+def wait_for_result(task_id: str) -> dict:
+    """
+    Long-poll /tasks/{task_id}/wait until the task is done or failed.
+    The backend answers the moment the worker emits the task's event.
+    """
+    while True:
+        resp = requests.get(
+            f"{BACKEND_URL}/tasks/{task_id}/wait",
+            params={"timeout": WAIT_TIMEOUT},
+            timeout=WAIT_TIMEOUT + 10,
+        )
+        resp.raise_for_status()
+        task = resp.json()
+        if task["status"] in ("done", "error"):
+            return task
 
-        # 2) Poll /events until we see an event for this task_id
-        result = None
-        error = None
-
-        while True:
-            ev_resp = requests.get(f"{BACKEND_URL}/events", timeout=10)
-            ev_resp.raise_for_status()
-            events = ev_resp.json()  # list of {event_id, task_id, status, ...}
-
-            found = False
-            for ev in events:
-                if ev["task_id"] == task_id:
-                    found = True
-                    if ev["status"] == "done":
-                        result = ev["result"]
-                    else:
-                        error = ev["error"]
+
+def stream_result(task_id: str) -> dict:
+    """
+    Follow GET /tasks/{task_id}/stream, printing the answer as it is
+    generated, and return the final task status.
+    """
+    streamed = False
+    with requests.get(f"{BACKEND_URL}/tasks/{task_id}/stream", stream=True, timeout=(10, 60)) as resp:
+        resp.raise_for_status()
+        event = None
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "delta":
+                    print(data, end="", flush=True)
+                    streamed = True
+                elif event == "tool_call":
+                    print(f"(calling {data['tool']})", flush=True)
+                elif event == "task":
+                    task = data
                     break
+        else:
+            # Stream dropped before the final event: fall back to long-polling.
+            task = wait_for_result(task_id)
+    if not streamed and task["status"] == "done":
+        # Workers in another process only report the finished answer.
+        print(task["result"], end="")
+    return task
 
-            if found:
-                break
 
-            # No relevant event yet → wait a bit and poll again
-            time.sleep(0.5)
+def chat():
+    print("🌤  Weather Agent (Background Task Queue). Type 'exit' to quit.\n")
 
+    while True:
+        user = input("You: ").strip()
+        if user.lower() in ("exit", "quit"):
+            break
+
+        # 1) Create task
+        task_id = submit_task(user)
+        print(f"(submitted task_id={task_id})")
+
+        # 2) Stream the answer while the agent generates it
         print("\nAssistant:")
-        if error:
-            print("Error:", error)
-        else:
-            print(result)
+        task = stream_result(task_id)
+
+        if task["status"] == "error":
+            print("Error:", task["error"])
         print()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather agent CLI")
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Keep one conversation for the whole run, so follow-up questions see earlier turns",
+    )
+    if parser.parse_args().session:
+        SESSION_ID = uuid.uuid4().hex
     chat()
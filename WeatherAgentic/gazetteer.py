@@ -0,0 +1,277 @@
+# gazetteer.py
+"""
+Offline city-name resolver: maps free-text city strings ("SLC",
+"salt lake city, UT", "Salt Lake", "Salt Lkae City") to one canonical
+place, so they share one weather cache entry and one upstream fetch.
+
+Places come from a bundled TSV (data/cities.tsv). Names and aliases are
+indexed three ways, tried in order:
+
+- exact: normalized name -> places
+- prefix: the same names in one sorted array, searched with bisect
+  ("salt lake" -> "salt lake city")
+- fuzzy: every name with one character deleted -> names, so candidates
+  within one typo are found with a handful of dict lookups
+  (symmetric-delete), then checked for being one edit apart.
+
+Prefix and fuzzy matches must be unique: a short or ambiguous string is
+more likely a city the file does not have ("York", "Kiel") than a typo.
+Likewise a state or country the file does not know ("Manchester, NH")
+means a place it does not have, so nothing is resolved.
+"""
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.tsv"),
+)
+
+# Shortest inputs matched by prefix / fuzzily; below that only exact names
+# count ("sf" is an alias, "york" is not a typo of "cork").
+MIN_PREFIX_CHARS = 6
+MIN_FUZZY_CHARS = 6
+
+# Common names for countries the file spells differently, mapped to the
+# file's own region words. Any other unknown region fails the lookup.
+REGION_ALIASES: Dict[str, str] = {
+    "usa": "us",
+    "america": "us",
+    "united states of america": "us",
+    "uk": "gb",
+    "britain": "gb",
+    "great britain": "gb",
+    "england": "gb",
+    "scotland": "gb",
+    "wales": "gb",
+    "northern ireland": "gb",
+    "holland": "nl",
+    "the netherlands": "nl",
+    "korea": "kr",
+    "uae": "ae",
+    "czech republic": "cz",
+}
+
+_PUNCT = re.compile(r"[^a-z0-9,]+")
+
+
+class Place(NamedTuple):
+    id: str          # e.g. "us-ut-salt-lake-city"
+    name: str
+    admin: str       # state / province, may be empty
+    country: str
+    query: str       # what to send to wttr.in
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase, accents folded to ASCII, punctuation dropped, whitespace
+    collapsed: "Zürich " -> "zurich", "St. Louis" -> "st louis".
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _PUNCT.sub(" ", text.replace(".", "").replace("'", ""))
+    return ", ".join(" ".join(part.split()) for part in text.split(",") if part.strip())
+
+
+def _slug(text: str) -> str:
+    return normalize(text).replace(",", "").replace(" ", "-")
+
+
+def _deletes(word: str) -> Iterable[str]:
+    return (word[:i] + word[i + 1:] for i in range(len(word)))
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    # At most one insert, delete, substitution or swap of neighbours; O(n).
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return (
+            a[i + 1:] == b[i + 1:]
+            or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+        )
+    return a[i:] == b[i + 1:]
+
+
+class Gazetteer:
+    """
+    Places plus the exact / prefix / fuzzy name indexes over them. Place
+    numbers are row numbers, so a lower number means higher priority.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, str, str, str, str, List[str]]]):
+        self.places: List[Place] = []
+        # region words ("ut", "utah", "us", "united states") per place
+        self._regions: List[frozenset] = []
+        self._names: List[Tuple[str, ...]] = []
+        self._exact: Dict[str, Tuple[int, ...]] = {}
+        self.region_words: Set[str] = set()
+
+        exact: Dict[str, List[int]] = {}
+        seen_ids = set()
+        for name, admin, admin_code, country, country_code, aliases in rows:
+            place_id = "-".join(p for p in (country_code.lower(), admin_code.lower(), _slug(name)) if p)
+            if place_id in seen_ids:
+                raise ValueError(f"Duplicate gazetteer place {place_id}")
+            seen_ids.add(place_id)
+
+            n = len(self.places)
+            self.places.append(Place(place_id, name, admin, country, f"{name},{admin or country}"))
+            regions = frozenset(normalize(r) for r in (admin, admin_code, country, country_code) if r)
+            self._regions.append(regions)
+            self.region_words |= regions
+            names = tuple(dict.fromkeys(k for k in (normalize(name), *map(normalize, aliases)) if k))
+            self._names.append(names)
+            for key in names:
+                exact.setdefault(key, []).append(n)
+        self._exact = {key: tuple(ns) for key, ns in exact.items()}
+
+        # Prefix index: all names, sorted.
+        self._sorted_keys: List[str] = sorted(self._exact)
+
+        # Fuzzy index: one-deletion variants -> names. Shorter names are
+        # still found from an input with one extra letter ("pariss").
+        deletes: Dict[str, Set[str]] = {}
+        for key in self._exact:
+            if len(key) >= MIN_FUZZY_CHARS:
+                for variant in _deletes(key):
+                    deletes.setdefault(variant, set()).add(key)
+        self._deletes: Dict[str, Tuple[str, ...]] = {v: tuple(keys) for v, keys in deletes.items()}
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#") or line.startswith("name\t"):
+                    continue
+                name, admin, admin_code, country, country_code, aliases = line.rstrip("\n").split("\t")
+                rows.append((name, admin, admin_code, country, country_code,
+                             [a for a in aliases.split("|") if a]))
+        return cls(rows)
+
+    def place_names(self) -> List[Tuple[str, ...]]:
+        """
+        The normalized name and aliases of each place, in place order.
+        """
+        return self._names
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "places": len(self.places),
+            "names": len(self._exact),
+            "fuzzy_variants": len(self._deletes),
+        }
+
+    # ----------------------------
+    #   LOOKUP
+    # ----------------------------
+
+    def _unique(self, keys: Iterable[str]) -> Tuple[int, ...]:
+        # The places of the matched names if they all name one place first
+        # (aliases of one city, or one name several rows share), else ().
+        keys = list(keys)
+        if len({self._exact[key][0] for key in keys}) != 1:
+            return ()
+        return tuple(sorted({n for key in keys for n in self._exact[key]}))
+
+    def _prefix(self, name: str) -> Tuple[int, ...]:
+        if len(name) < MIN_PREFIX_CHARS:
+            return ()
+        # A single whole word may be completed ("copenh") but not extended
+        # by more words: "jersey" is a place of its own, not Jersey City.
+        one_word = " " not in name
+        i = bisect_left(self._sorted_keys, name)
+        # Names sharing the prefix are contiguous; a few dozen at most.
+        keys = []
+        for key in self._sorted_keys[i:i + 64]:
+            if not key.startswith(name):
+                break
+            if one_word and key[len(name):len(name) + 1] == " ":
+                return ()
+            keys.append(key)
+        return self._unique(keys)
+
+    def _fuzzy(self, name: str) -> Tuple[int, ...]:
+        if len(name) < MIN_FUZZY_CHARS:
+            return ()
+        candidates: Set[str] = set(self._deletes.get(name, ()))
+        for variant in _deletes(name):
+            if variant in self._exact:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        return self._unique(key for key in candidates if _within_one_edit(name, key))
+
+    def _match(self, name: str) -> Tuple[int, ...]:
+        exact = self._exact.get(name)
+        if exact or name in self.region_words:
+            # A bare state or country ("kansas") is not a city prefix or typo.
+            return exact or ()
+        return self._prefix(name) or self._fuzzy(name)
+
+    def _split_region(self, text: str) -> Tuple[str, List[str]]:
+        # "salt lake city, ut" / "portland, or, usa" / "portland or"
+        # -> (name, [region, ...])
+        if "," in text:
+            name, *regions = text.split(", ")
+            return name, regions
+        words = text.split()
+        for n in (3, 2, 1):
+            if len(words) > n and self._region(" ".join(words[-n:])):
+                return " ".join(words[:-n]), [" ".join(words[-n:])]
+        return text, []
+
+    def _region(self, word: str) -> Optional[str]:
+        # The file's own region word for word, or None if it knows none.
+        word = REGION_ALIASES.get(word, word)
+        return word if word in self.region_words else None
+
+    def resolve(self, text: str) -> Optional[Place]:
+        """
+        The place a city string most likely means, or None. A state or
+        country named in the string must match, and one the file does not
+        know matches nothing; among the remaining places with that name,
+        the highest-priority one wins.
+        """
+        text = normalize(text)
+        if not text:
+            return None
+
+        exact = self._exact.get(text.replace(",", ""))
+        if exact:
+            return self.places[exact[0]]
+
+        name, regions = self._split_region(text)
+        regions = [self._region(r) for r in regions]
+        if None in regions:
+            # "manchester, nh": a Manchester the file does not have.
+            return None
+        matches = self._match(name)
+        if regions:
+            matches = tuple(n for n in matches if all(r in self._regions[n] for r in regions))
+            if not matches and "," not in text:
+                # "little ro" is a prefix of Little Rock, not Little in Romania.
+                matches = self._match(text)
+        return self.places[matches[0]] if matches else None
+
+
+_default: Optional[Gazetteer] = None
+
+
+def default_gazetteer() -> Gazetteer:
+    """
+    The gazetteer from GAZETTEER_PATH, loaded on first use.
+    """
+    global _default
+    if _default is None:
+        _default = Gazetteer.load()
+    return _default
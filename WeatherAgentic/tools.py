@@ -1,13 +1,53 @@
-from typing import Literal, Optional
-import requests
+import asyncio
+from bisect import bisect_right
+from typing import List, Literal, Optional
 from agents import function_tool
 
+from metrics import Counter
+from weather_api import DayForecast, cache_key, get_current_condition, get_weather_snapshot
+
+# Cities per get_weather_many call; the rest are reported as skipped.
+MAX_CITIES_PER_CALL = 10
+
+TOOL_ERRORS = Counter(
+    "weatheragent_tool_errors_total",
+    "Tool calls that returned an error to the agent",
+    ["tool"],
+)
+
 # ============================
 #   TOOL DEFINITION
 # ============================
 
+def format_current(city: str, current: dict, units: str) -> str:
+    """
+    Render wttr.in's current_condition block as the tool's text output.
+    """
+    desc = current["weatherDesc"][0]["value"]
+
+    temp_c = float(current["temp_C"])
+    feels_c = float(current["FeelsLikeC"])
+    temp_f = float(current["temp_F"])
+    feels_f = float(current["FeelsLikeF"])
+
+    if units == "metric":
+        temp = f"{temp_c}°C"
+        feels = f"{feels_c}°C"
+    else:
+        temp = f"{temp_f}°F"
+        feels = f"{feels_f}°F"
+
+    return (
+        f"Weather in {city}:\n"
+        f"- Condition: {desc}\n"
+        f"- Temperature: {temp}\n"
+        f"- Feels like: {feels}\n"
+        f"- Humidity: {current['humidity']}%"
+    )
+
+
 @function_tool
-def get_weather(city: str, units: Literal["metric", "imperial"] = "metric") -> str:
+async def get_weather(city: str, units: Literal["metric", "imperial"] = "metric") -> str:
     """
     Fetch weather for a city using wttr.in (no API key needed).
 
@@ -16,50 +56,114 @@ def get_weather(city: str, units: Literal["metric", "imperial"] = "metric") -> s
         units: metric -> °C, imperial -> °F
     """
     try:
-        resp = requests.get(f"https://wttr.in/{city}", params={"format": "j1"}, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        current = await get_current_condition(city)
+        return format_current(city, current, units)
+
+    except Exception as e:
+        TOOL_ERRORS.inc("get_weather")
+        return f"Failed to fetch weather for {city}. Error: {str(e)}"
+
 
-        current = data["current_condition"][0]
-        desc = current["weatherDesc"][0]["value"]
+@function_tool
+async def get_weather_many(
+    cities: List[str],
+    units: Literal["metric", "imperial"] = "metric",
+) -> str:
+    """
+    Fetch current weather for several cities at once (one block per city).
+    Use this instead of repeated get_weather calls when comparing cities.
+
+    Args:
+        cities: e.g. ["Denver", "Salt Lake City", "Boise"]
+        units: metric -> °C, imperial -> °F
+    """
+    unique: dict = {}
+    for city in cities:
+        if city.strip():
+            unique.setdefault(cache_key(city), city.strip())
+    names = list(unique.values())
+    wanted, skipped = names[:MAX_CITIES_PER_CALL], names[MAX_CITIES_PER_CALL:]
 
-        temp_c = float(current["temp_C"])
-        feels_c = float(current["FeelsLikeC"])
-        temp_f = float(current["temp_F"])
-        feels_f = float(current["FeelsLikeF"])
+    # All fetches share weather_api's connection pool and cache.
+    results = await asyncio.gather(
+        *(get_current_condition(city) for city in wanted),
+        return_exceptions=True,
+    )
 
-        if units == "metric":
-            temp = f"{temp_c}°C"
-            feels = f"{feels_c}°C"
+    blocks = []
+    for city, current in zip(wanted, results):
+        if isinstance(current, Exception):
+            TOOL_ERRORS.inc("get_weather_many")
+            blocks.append(f"Failed to fetch weather for {city}. Error: {str(current)}")
         else:
-            temp = f"{temp_f}°F"
-            feels = f"{feels_f}°F"
+            blocks.append(format_current(city, current, units))
+    if skipped:
+        blocks.append(f"Not fetched (max {MAX_CITIES_PER_CALL} cities per call): {', '.join(skipped)}")
+    return "\n\n".join(blocks) or "No cities given."
 
-        return (
-            f"Weather in {city}:\n"
-            f"- Condition: {desc}\n"
-            f"- Temperature: {temp}\n"
-            f"- Feels like: {feels}\n"
-            f"- Humidity: {current['humidity']}%"
-        )
 
+def format_forecast(city: str, day: DayForecast, hour: Optional[int], units: str) -> str:
+    """
+    Render one compacted forecast day: the slot covering `hour`, or every
+    slot of the day if hour is None.
+    """
+    metric = units == "metric"
+    deg = "°C" if metric else "°F"
+    temps = day.temp_c if metric else day.temp_f
+
+    def slot(i: int) -> str:
+        line = f"{day.hours[i]:02d}:00 {day.desc[i]}, {temps[i]}{deg}, rain {day.chance_of_rain[i]}%"
+        if day.chance_of_snow[i]:
+            line += f", snow {day.chance_of_snow[i]}%"
+        return line
+
+    if hour is not None and day.hours:
+        i = max(bisect_right(day.hours, hour) - 1, 0)
+        return f"Forecast for {city} on {day.date}: {slot(i)}"
+
+    high, low = (day.max_c, day.min_c) if metric else (day.max_f, day.min_f)
+    lines = [f"Forecast for {city} on {day.date} (high {high}{deg}, low {low}{deg}):"]
+    lines += [f"- {slot(i)}" for i in range(len(day.hours))]
+    return "\n".join(lines)
+
+
+@function_tool
+async def get_forecast(
+    city: str,
+    day: int = 0,
+    hour: Optional[int] = None,
+    units: Literal["metric", "imperial"] = "metric",
+) -> str:
+    """
+    Fetch the forecast for a city using wttr.in: the whole day, or just the
+    time around one hour (e.g. hour=21 for "tonight").
+
+    Args:
+        city: e.g. "Salt Lake City"
+        day: 0 = today, 1 = tomorrow, 2 = the day after
+        hour: local hour of the day, 0-23 (omit for the whole day)
+        units: metric -> °C, imperial -> °F
+    """
+    try:
+        snapshot = await get_weather_snapshot(city)
     except Exception as e:
-        return f"Failed to fetch weather for {city}. Error: {str(e)}"
+        TOOL_ERRORS.inc("get_forecast")
+        return f"Failed to fetch forecast for {city}. Error: {str(e)}"
+
+    if not 0 <= day < len(snapshot.days):
+        return f"No forecast for day {day}; available days are 0 to {len(snapshot.days) - 1}."
+    if hour is not None and not 0 <= hour <= 23:
+        return f"Invalid hour {hour}; use 0-23."
+    return format_forecast(city, snapshot.days[day], hour, units)
 
 
 # ============================
 #   TOOL 2: CLOTHING ADVICE
 # ============================
-@function_tool
-def recommend_clothing(
-    temp_c: float,
-    condition: str,
-    activity: Optional[str] = None,
-) -> str:
+def clothing_advice(temp_c: float, condition: str, activity: Optional[str] = None) -> str:
     """
-    Recommend what to wear based on temperature, condition, and optional activity.
+    The clothing rules behind recommend_clothing, callable without the agent.
     """
-
     # Simple rules – you can tweak as you like
     advice_parts = []
 
@@ -90,3 +194,15 @@ def recommend_clothing(
             advice_parts.append("Wear breathable sportswear suitable for the temperature.")
 
     return " ".join(advice_parts)
+
+
+@function_tool
+def recommend_clothing(
+    temp_c: float,
+    condition: str,
+    activity: Optional[str] = None,
+) -> str:
+    """
+    Recommend what to wear based on temperature, condition, and optional activity.
+    """
+    return clothing_advice(temp_c, condition, activity)
@@ -0,0 +1,278 @@
+# weather_api.py
+"""
+Async client for wttr.in shared by the weather tools.
+
+A single httpx.AsyncClient keeps a pool of keep-alive connections, so tool
+calls neither block the event loop nor pay a fresh TCP+TLS handshake on
+every request.
+"""
+import os
+import sys
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+
+from gazetteer import default_gazetteer
+from metrics import CallbackMetric, Counter, Histogram
+from weather_cache import TTLCache
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx when installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Point this at a local stub server for testing.
+WTTR_BASE_URL = os.getenv("WTTR_BASE_URL", "https://wttr.in")
+WTTR_POOL_SIZE = int(os.getenv("WTTR_POOL_SIZE", "20"))
+WTTR_KEEPALIVE = int(os.getenv("WTTR_KEEPALIVE", str(WTTR_POOL_SIZE)))
+WTTR_CONNECT_TIMEOUT = float(os.getenv("WTTR_CONNECT_TIMEOUT", "3.0"))
+WTTR_READ_TIMEOUT = float(os.getenv("WTTR_READ_TIMEOUT", "10.0"))
+WTTR_HTTP2 = os.getenv("WTTR_HTTP2", "1") == "1"
+
+# Current conditions change on a scale of minutes.
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "300"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+
+# Map city strings to gazetteer places ("SLC" -> Salt Lake City, Utah)
+# before caching and fetching, so spellings of one city share an entry.
+CITY_RESOLVER = os.getenv("CITY_RESOLVER", "1") == "1"
+
+_client: httpx.AsyncClient | None = None
+
+UPSTREAM_SECONDS = Histogram(
+    "weatheragent_upstream_request_seconds",
+    "Duration of HTTP requests to the weather API",
+)
+UPSTREAM_ERRORS = Counter(
+    "weatheragent_upstream_errors_total",
+    "Failed HTTP requests to the weather API",
+)
+
+# While set (by the worker, around one agent run), every weather lookup
+# appends (city key, cache version) here; the version is None if the fetch
+# failed. The answer cache uses this to know which snapshots an answer is
+# based on.
+weather_deps: ContextVar[Optional[List[Tuple[str, Optional[int]]]]] = ContextVar(
+    "weather_deps", default=None
+)
+
+
+# Called with (cache key, city as asked) on every weather lookup; the cache
+# warmer uses this to learn which cities are popular.
+lookup_listeners: List[Callable[[str, str], None]] = []
+
+
+class DayForecast(NamedTuple):
+    """
+    One day of the j1 forecast as parallel arrays, one slot per
+    forecast hour (wttr.in gives 8: 0:00, 3:00, ... 21:00).
+    """
+    date: str
+    max_c: int
+    min_c: int
+    max_f: int
+    min_f: int
+    hours: Tuple[int, ...]
+    temp_c: Tuple[int, ...]
+    temp_f: Tuple[int, ...]
+    desc: Tuple[str, ...]
+    chance_of_rain: Tuple[int, ...]
+    chance_of_snow: Tuple[int, ...]
+
+
+class WeatherSnapshot(NamedTuple):
+    """
+    The parts of one j1 payload the tools use: the current_condition
+    block and the compacted forecast days.
+    """
+    current: Dict[str, Any]
+    days: Tuple[DayForecast, ...]
+
+
+def _compact_day(day: Dict[str, Any]) -> DayForecast:
+    hourly = day.get("hourly", [])
+    temp_c = tuple(int(h["tempC"]) for h in hourly)
+    temp_f = tuple(int(h["tempF"]) for h in hourly)
+    return DayForecast(
+        date=day.get("date", ""),
+        max_c=int(day.get("maxtempC", max(temp_c, default=0))),
+        min_c=int(day.get("mintempC", min(temp_c, default=0))),
+        max_f=int(day.get("maxtempF", max(temp_f, default=0))),
+        min_f=int(day.get("mintempF", min(temp_f, default=0))),
+        hours=tuple(int(h.get("time", "0")) // 100 for h in hourly),
+        temp_c=temp_c,
+        temp_f=temp_f,
+        # The same few descriptions repeat across every cached city.
+        desc=tuple(sys.intern(h["weatherDesc"][0]["value"].strip()) for h in hourly),
+        chance_of_rain=tuple(int(h.get("chanceofrain", 0)) for h in hourly),
+        chance_of_snow=tuple(int(h.get("chanceofsnow", 0)) for h in hourly),
+    )
+
+
+def compact_payload(data: Dict[str, Any]) -> WeatherSnapshot:
+    """
+    Keep what the tools need from a j1 payload (it also carries
+    astronomy, per-hour wind/pressure/visibility, request echo, ...).
+    """
+    return WeatherSnapshot(
+        current=data["current_condition"][0],
+        days=tuple(_compact_day(day) for day in data.get("weather", [])),
+    )
+
+
+# Keyed on the gazetteer place id, or the normalized city name for cities
+# not in the gazetteer (see cache_key()). Both unit systems are present in the
+# payload, so metric and imperial lookups share one entry, and current
+# conditions and forecasts come from the same fetch.
+weather_cache: TTLCache[WeatherSnapshot] = TTLCache(
+    ttl=WEATHER_CACHE_TTL,
+    max_size=WEATHER_CACHE_SIZE,
+)
+
+CallbackMetric(
+    "weatheragent_weather_cache_lookups_total",
+    "Weather cache lookups by result",
+    lambda: {("hit",): weather_cache.hits, ("miss",): weather_cache.misses},
+    ["result"],
+    kind="counter",
+)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=WTTR_BASE_URL,
+            http2=WTTR_HTTP2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=WTTR_POOL_SIZE,
+                max_keepalive_connections=WTTR_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(
+                WTTR_READ_TIMEOUT,
+                connect=WTTR_CONNECT_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """
+    Close the shared client (call on app shutdown).
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_weather_json(city: str) -> Dict[str, Any]:
+    """
+    Fetch the raw wttr.in j1 payload for a city.
+    """
+    started = time.monotonic()
+    try:
+        resp = await get_client().get(f"/{quote(city)}", params={"format": "j1"})
+        resp.raise_for_status()
+        return resp.json()
+    except Exception:
+        UPSTREAM_ERRORS.inc()
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.monotonic() - started)
+
+
+def normalize_city(city: str) -> str:
+    """
+    Case- and whitespace-insensitive cache key for a city name.
+    """
+    return " ".join(city.lower().replace(",", " ").split())
+
+
+RESOLVED = Counter(
+    "weatheragent_city_resolutions_total",
+    "Distinct city strings looked up, by whether the gazetteer knew them",
+    ["result"],
+)
+
+
+@lru_cache(maxsize=4096)
+def resolve_city(city: str) -> Tuple[str, str]:
+    """
+    (cache key, wttr.in query) for a city string: the gazetteer place id
+    and its "name,state/country", or the normalized string and the string
+    itself for places the gazetteer does not know.
+    """
+    place = default_gazetteer().resolve(city) if CITY_RESOLVER else None
+    if place is None:
+        RESOLVED.inc("unknown")
+        return normalize_city(city), city
+    RESOLVED.inc("resolved")
+    return place.id, place.query
+
+
+def cache_key(city: str) -> str:
+    """
+    The weather cache key a city string is looked up under.
+    """
+    return resolve_city(city)[0]
+
+
+async def _load_snapshot(city: str) -> WeatherSnapshot:
+    return compact_payload(await fetch_weather_json(city))
+
+
+async def get_weather_snapshot(city: str) -> WeatherSnapshot:
+    """
+    Return the current conditions and forecast for a city, served from
+    weather_cache when fresh.
+    """
+    key, query = resolve_city(city)
+    for listener in lookup_listeners:
+        listener(key, city)
+    deps = weather_deps.get()
+    try:
+        snapshot, version = await weather_cache.get_or_load_versioned(key, lambda: _load_snapshot(query))
+    except Exception:
+        if deps is not None:
+            deps.append((key, None))
+        raise
+    if deps is not None:
+        deps.append((key, version))
+    return snapshot
+
+
+async def refresh_weather(city: str) -> int:
+    """
+    Re-fetch a city's weather into weather_cache ahead of expiry, without
+    counting as a lookup; returns the new cache version.
+    """
+    key, query = resolve_city(city)
+    _, version = await weather_cache.refresh(key, lambda: _load_snapshot(query))
+    return version
+
+
+async def prefetch_weather(city: str) -> int:
+    """
+    Load a city's weather into weather_cache unless it is fresh there,
+    without counting as a lookup (the lookup it is meant for counts);
+    returns the cache version.
+    """
+    key, query = resolve_city(city)
+    _, version = await weather_cache.get_or_load_versioned(key, lambda: _load_snapshot(query))
+    return version
+
+
+async def get_current_condition(city: str) -> Dict[str, Any]:
+    """
+    Return wttr.in's current_condition block for a city.
+    """
+    return (await get_weather_snapshot(city)).current
@@ -0,0 +1,183 @@
+# weather_cache.py
+"""
+Small in-process TTL cache with LRU eviction and single-flight loading.
+
+Concurrent get_or_load() calls for the same key share one in-flight load,
+so N tasks asking about the same city produce a single upstream request.
+Every stored value gets a new version number, so callers can tell whether
+the value they saw earlier is still the one being served.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+
+        # key -> (expires_at, version, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, V]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._next_version = 1
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[float, int, V]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Return a fresh cached value, or None. Counts a hit or a miss.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def version(self, key: Hashable) -> Optional[int]:
+        """
+        Version of the fresh value cached for key, or None. Does not count
+        as a lookup.
+        """
+        entry = self._lookup(key)
+        return entry[1] if entry is not None else None
+
+    def ttl_remaining(self, key: Hashable) -> Optional[float]:
+        """
+        Seconds until the fresh value for key expires, or None. Does not
+        count as a lookup.
+        """
+        entry = self._lookup(key)
+        return entry[0] - self._clock() if entry is not None else None
+
+    def set(self, key: Hashable, value: V) -> int:
+        """
+        Store value under key and return its new version.
+        """
+        version = self._next_version
+        self._next_version += 1
+        self._entries[key] = (self._clock() + self.ttl, version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return version
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[V]]) -> V:
+        """
+        Return the cached value for key, loading it with loader() on a miss.
+
+        Only one load per key runs at a time; concurrent callers await the
+        same result. Failed loads are not cached.
+        """
+        value, _ = await self.get_or_load_versioned(key, loader)
+        return value
+
+    async def get_or_load_versioned(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[V]],
+    ) -> Tuple[V, int]:
+        """
+        Like get_or_load(), but also return the version of the value.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[1]
+        self.misses += 1
+
+        load = self._inflight.get(key)
+        if load is not None:
+            self.coalesced += 1
+        else:
+            load = self._start_load(key, loader)
+
+        # shield(): one caller being cancelled must not cancel the shared load
+        return await asyncio.shield(load)
+
+    async def refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[V]],
+    ) -> Tuple[V, int]:
+        """
+        Load key again even if a fresh value is cached, replacing it on
+        success (joins a load already in flight). Not counted as a lookup.
+        """
+        load = self._inflight.get(key)
+        if load is None:
+            load = self._start_load(key, loader)
+        return await asyncio.shield(load)
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[V]]) -> "asyncio.Future[Tuple[V, int]]":
+        load = asyncio.ensure_future(self._load(key, loader))
+        self._inflight[key] = load
+        # Every awaiter may be gone (cancelled) by the time a shielded load
+        # fails; retrieve the error so asyncio does not log it as lost.
+        load.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return load
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[V]]) -> Tuple[V, int]:
+        try:
+            value = await loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return value, self.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "load_errors": self.load_errors,
+            "inflight": len(self._inflight),
+        }